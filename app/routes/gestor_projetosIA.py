@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import unicodedata
+from pydantic import BaseModel, Field
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from cache import TTLCache
+
+IA_MODEL = os.getenv("IA_MODEL", "llama-3.3-70b-versatile")
+IA_TEMPERATURE = float(os.getenv("IA_TEMPERATURE", "0.2"))
+IA_TIMEOUT = float(os.getenv("IA_TIMEOUT", "60"))
+IA_CACHE_SIZE = int(os.getenv("IA_CACHE_SIZE", "512"))
+IA_CACHE_TTL = float(os.getenv("IA_CACHE_TTL", "3600"))
+# Com a chave normalizada, "App  de Vendas" e "app de vendas" caem no mesmo plano
+IA_CACHE_NORMALIZE = os.getenv("IA_CACHE_NORMALIZE", "true").lower() == "true"
+# Balde de fichas por usuário: IA_BURST pedidos de uma vez, recarga de IA_RATE_PER_MINUTE
+IA_RATE_PER_MINUTE = float(os.getenv("IA_RATE_PER_MINUTE", "6"))
+IA_BURST = int(os.getenv("IA_BURST", "3"))
+MAX_FIELD_LENGTH = {"nome": 200, "tipo": 100, "descricao": 4000}
+
+class Etapa(BaseModel):
+    titulo: str
+    descricao: str
+    duracao_dias: int = Field(ge=0)
+
+class PlanoProjeto(BaseModel):
+    resumo: str
+    etapas: list[Etapa]
+    riscos: list[str] = []
+    tecnologias: list[str] = []
+    prazo_total_dias: int = Field(ge=0)
+
+parser = PydanticOutputParser(pydantic_object=PlanoProjeto)
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "Você é um gerente de projetos de software. A partir do nome, tipo e "
+     "descrição de um projeto, monte um plano objetivo em português, com "
+     "etapas em ordem de execução, duração estimada de cada uma, riscos e "
+     "tecnologias sugeridas.\n{format_instructions}"),
+    ("human", "Nome: {nome}\nTipo: {tipo}\nDescrição: {descricao}"),
+]).partial(format_instructions=parser.get_format_instructions())
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Limite de pedidos atingido; tente novamente em {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class PlannerError(Exception):
+    pass
+
+def _normalize(text: str) -> str:
+    # Sem acentos, pontuação, caixa ou espaços repetidos
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+def _key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class TokenBucket:
+    """
+    Limite por chave (usuário): ``capacity`` fichas, recarregadas a
+    ``rate`` fichas por segundo. Baldes parados por mais que o tempo de
+    recarga completa expiram do cache, que equivale a estarem cheios.
+    """
+    def __init__(self, rate: float, capacity: int, maxsize: int = 10000, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._buckets = TTLCache(maxsize=maxsize, ttl=capacity / rate)
+
+    def take(self, key) -> float:
+        """Consome uma ficha; retorna 0 ou quantos segundos faltam para a próxima."""
+        now = self.clock()
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+class _Generation:
+    """
+    Uma chamada ao modelo, compartilhada por todos os pedidos idênticos
+    que chegarem enquanto ela está em andamento.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.plan = None
+        self.error = None
+        self._changed = asyncio.Event()
+        self._done = asyncio.Event()
+
+    @classmethod
+    def completed(cls, plan: dict) -> "_Generation":
+        generation = cls()
+        generation.finish(plan)
+        return generation
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _notify(self) -> None:
+        # Acorda quem está esperando e arma um evento novo para a próxima parte
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def append(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, plan: dict) -> None:
+        self.plan = plan
+        self._done.set()
+        self._notify()
+
+    def fail(self, error: Exception) -> None:
+        self.error = error
+        self._done.set()
+        self._notify()
+
+    async def result(self) -> dict:
+        await self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.plan
+
+    async def events(self):
+        """``("chunk", texto)`` à medida que o modelo responde e, no fim, ``("plan", dict)``."""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield "chunk", self.chunks[index]
+                index += 1
+            if self.done:
+                break
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+        yield "plan", self.plan
+
+class ProjectPlanner:
+    """
+    Assistente de planejamento de projetos (Groq via LangChain).
+
+    - Respostas ficam em cache (LRU com TTL) pela chave exata do pedido e,
+      com ``IA_CACHE_NORMALIZE``, também por uma chave normalizada.
+    - Pedidos idênticos simultâneos compartilham a mesma chamada ao modelo.
+    - Cada usuário tem um balde de fichas; só chamadas novas ao modelo
+      consomem fichas (acertos de cache e pedidos repetidos não).
+
+    ``llm`` pode ser qualquer chat model do LangChain; sem ele, o ChatGroq
+    é criado no primeiro uso (precisa de ``GROQ_API_KEY``).
+    """
+    def __init__(
+        self,
+        llm=None,
+        cache_size: int = IA_CACHE_SIZE,
+        cache_ttl: float = IA_CACHE_TTL,
+        normalize: bool = IA_CACHE_NORMALIZE,
+        rate_per_minute: float = IA_RATE_PER_MINUTE,
+        burst: int = IA_BURST,
+        timeout: float = IA_TIMEOUT
+    ):
+        self._llm = llm
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.normalize = normalize
+        self.limiter = TokenBucket(rate_per_minute / 60, burst)
+        self.timeout = timeout
+        self.in_flight = {}  # chave -> _Generation
+        self._tasks = set()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            self._llm = ChatGroq(model=IA_MODEL, temperature=IA_TEMPERATURE)
+        return self._llm
+
+    def _keys(self, fields: dict) -> list:
+        values = [fields["nome"], fields["tipo"], fields["descricao"]]
+        keys = [_key(IA_MODEL, *values)]
+        if self.normalize:
+            keys.append(_key(IA_MODEL, "normalized", *map(_normalize, values)))
+        return keys
+
+    def request(self, user_id: str, nome: str, tipo: str, descricao: str) -> _Generation:
+        """
+        Retorna a geração do plano: já concluída (cache), em andamento (pedido
+        idêntico de outra requisição) ou recém-iniciada. Levanta
+        RateLimitExceeded se for preciso chamar o modelo e o usuário não
+        tiver fichas.
+        """
+        fields = {"nome": nome.strip(), "tipo": tipo.strip(), "descricao": descricao.strip()}
+        keys = self._keys(fields)
+        for key in keys:
+            plan = self.cache.get(key)
+            if plan is not None:
+                return _Generation.completed(plan)
+
+        generation = self.in_flight.get(keys[-1])
+        if generation is not None:
+            return generation
+
+        retry_after = self.limiter.take(user_id)
+        if retry_after:
+            raise RateLimitExceeded(retry_after)
+        generation = _Generation()
+        self.in_flight[keys[-1]] = generation
+        # A geração continua mesmo que o cliente desconecte: o resultado vai para o cache
+        task = asyncio.create_task(self._generate(generation, keys, fields))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return generation
+
+    async def plan(self, user_id: str, nome: str, tipo: str, descricao: str) -> dict:
+        return await self.request(user_id, nome, tipo, descricao).result()
+
+    async def _generate(self, generation: _Generation, keys: list, fields: dict) -> None:
+        try:
+            async with asyncio.timeout(self.timeout):
+                async for chunk in self.llm.astream(PROMPT.format_messages(**fields)):
+                    if chunk.content:
+                        generation.append(chunk.content)
+            plan = parser.parse("".join(generation.chunks)).model_dump()
+        except TimeoutError:
+            generation.fail(PlannerError("O modelo demorou demais para responder"))
+        except OutputParserException:
+            generation.fail(PlannerError("O modelo retornou um plano em formato inválido"))
+        except Exception as e:
+            print("❌ Erro ao gerar plano de projeto:", e)
+            generation.fail(PlannerError("Falha ao consultar o modelo"))
+        else:
+            for key in keys:
+                self.cache.set(key, plan)
+            generation.finish(plan)
+        finally:
+            self.in_flight.pop(keys[-1], None)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
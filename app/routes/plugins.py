@@ -1,23 +1,105 @@
-from fastapi import APIRouter, Request, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
 from fastapi import status
+from typing import Optional
+from app.routes.views_new import current_user, jobs, job_accepted
+from app.routes.gestor_projetosIA import ProjectPlanner, RateLimitExceeded, PlannerError, MAX_FIELD_LENGTH
+from http_cache import http_cache
+from jobs import RetryJob
+import json
 
 
 router = APIRouter(tags=["Backend","plugins"])
 
+planner = ProjectPlanner()
+
+def _validate(user: Optional[dict], nome: str, tipo: str, descricao: str) -> None:
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    for field, value in (("nome", nome), ("tipo", tipo), ("descricao", descricao)):
+        if not value.strip() or len(value) > MAX_FIELD_LENGTH[field]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Campo inválido: {field}")
+
+def _start(user: Optional[dict], nome: str, tipo: str, descricao: str):
+    _validate(user, nome, tipo, descricao)
+    try:
+        return planner.request(user["id"], nome, tipo, descricao)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
+
 
 #implementa a IA de gestão de projetos
 @router.post("/plugins/IaProjetos")
-async def IaProjetos(request: Request,
-cookie:str,
-nome: str,
-tipo: str,
-descricao: str,
+async def IaProjetos(
+    nome: str,
+    tipo: str,
+    descricao: str,
+    user: Optional[dict] = Depends(current_user)
+):
+    """Gera o plano do projeto (etapas, prazos, riscos e tecnologias)."""
+    generation = _start(user, nome, tipo, descricao)
+    try:
+        plan = await generation.result()
+    except PlannerError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    return {"nome": nome, "tipo": tipo, "descricao": descricao, "plano": plan}
 
+@router.post("/plugins/IaProjetos/stream")
+@http_cache(compress=False, etag=False)
+async def IaProjetos_stream(
+    nome: str,
+    tipo: str,
+    descricao: str,
+    user: Optional[dict] = Depends(current_user)
 ):
-    
-    if not cookie:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
-    return {"nome": nome, "tipo": tipo, "descricao": descricao, "cookie": cookie}, 
+    """
+    Mesmo plano via Server-Sent Events: eventos ``chunk`` com o texto
+    parcial do modelo e, no fim, ``plan`` (ou ``error``).
+    """
+    generation = _start(user, nome, tipo, descricao)
+
+    async def stream():
+        try:
+            async for event, data in generation.events():
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except PlannerError as e:
+            yield f"event: error\ndata: {json.dumps(str(e), ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/plugins/IaProjetos/jobs")
+async def IaProjetos_job(
+    response: Response,
+    nome: str,
+    tipo: str,
+    descricao: str,
+    idempotency_key: Optional[str] = Header(None),
+    user: Optional[dict] = Depends(current_user)
+):
+    """Gera o plano em segundo plano: responde 202 com o job a acompanhar em /jobs/{id}."""
+    _validate(user, nome, tipo, descricao)
+    job = await jobs.enqueue(
+        "ia.plan",
+        {"user_id": user["id"], "nome": nome, "tipo": tipo, "descricao": descricao},
+        idempotency_key=idempotency_key,
+        owner=user["id"]
+    )
+    return job_accepted(response, job)
 
+@jobs.handler("ia.plan", max_attempts=5)
+async def IaProjetos_run(job: dict) -> dict:
+    payload = job["payload"]
+    try:
+        plan = await planner.plan(payload["user_id"], payload["nome"], payload["tipo"], payload["descricao"])
+    except RateLimitExceeded as e:
+        # Sem fichas: espera a recarga em vez do backoff padrão
+        raise RetryJob(str(e), delay=e.retry_after)
+    return {"nome": payload["nome"], "tipo": payload["tipo"], "descricao": payload["descricao"], "plano": plan}
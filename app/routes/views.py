@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from db import Database
+from rendering import Templates
 from auth import create_token, verify_token, get_logged_user
 from datetime import datetime
 
@@ -54,7 +54,7 @@ def define_menu(user_type):
         return menu
 
 
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 router = APIRouter()
 db = Database()
 
@@ -79,7 +79,7 @@ def datetimeformat(value, format="short"):
     else:
         return value.strftime(format)
 
-templates.env.filters["datetimeformat"] = datetimeformat
+templates.add_filter("datetimeformat", datetimeformat)
 
 # Página de login
 @router.get("/", response_class=HTMLResponse)
@@ -101,7 +101,7 @@ async def post_login(
     password: str = Form(...),
     manter_conectado: str = Form(default=None)
 ):
-    user = db.get_users(username)
+    user = await db.get_users(username)
 
     if not user or not db.verificar_senha(password, user["senha"]):
         return templates.TemplateResponse("login.html", {
@@ -154,7 +154,7 @@ async def dashboard(request: Request, user=Depends(get_logged_user)):
     user_info = request.cookies.get("access_token")
     if user_info:
         user_info = verify_token(user_info)
-        user_info = db.get_user_by_id(user_info)
+        user_info = await db.get_user_by_id(user_info)
 
     user_safe = {
         "name": user_info["nome"],
@@ -173,7 +173,7 @@ async def dashboard(request: Request, user=Depends(get_logged_user)):
         "faturamento_percent": percentual_faturamento,
         "tickets_pendentes": tickets_pendentes,
         "proximas_entregas": proximas_entregas,
-    }
+    })
 
 # Calendário
 @router.get("/calendario", response_class=HTMLResponse)
@@ -186,7 +186,7 @@ async def servicos(request: Request, user=Depends(get_logged_user)):
     user_info = request.cookies.get("access_token")
     if user_info:
         user_info = verify_token(user_info)
-        user_info = db.get_user_by_id(user_info)
+        user_info = await db.get_user_by_id(user_info)
 
     user_safe = {
         "name": user_info["nome"],
@@ -194,7 +194,7 @@ async def servicos(request: Request, user=Depends(get_logged_user)):
         "role": user_info["cargo"]   
     }
 
-    services = db.get_services()
+    services = await db.get_services()
 
     return templates.TemplateResponse("service.html", {
         "request": request,
@@ -207,7 +207,7 @@ async def servicos(request: Request, user=Depends(get_logged_user)):
 @router.get("/servicos/adicionar")
 async def add_service(request: Request, user= Depends(get_logged_user)):
     return templates.TemplateResponse("add_service.html", {
-        "cliente": db.get_clients(),
+        "cliente": await db.get_clients(),
         "request": request,
         "user": request.cookies.get("access_token"),
         "menu": define_menu(request.cookies.get("access_token"))
@@ -223,7 +223,7 @@ async def add_service(request: Request, user= Depends(get_logged_user)):
 
     print(data)
     return templates.TemplateResponse("add_service.html", {
-        "cliente": db.get_clients(),
+        "cliente": await db.get_clients(),
         "request": request,
         "user": request.cookies.get("access_token"),
         "menu": define_menu(request.cookies.get("access_token"))
@@ -1,30 +1,70 @@
-from fastapi import APIRouter, Request, Form, Depends, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Request, Form, Depends, HTTPException, UploadFile, File, Body, Header
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response, FileResponse
 from database import (
     MongoDBConnection,
     UserService,
     ServiceManager,
-    PasswordHasher
+    ContractManager,
+    MetricsService,
+    PasswordHasher,
+    FileStorage,
+    FileTooLargeError,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_READ_SIZE
 )
-from auth import create_token, verify_token, get_logged_user
-from datetime import datetime
+from auth import create_token, verify_token, verify_cpf_batch, CPF_REASONS
+from thumbnails import ThumbnailCache, FORMATS as THUMBNAIL_FORMATS, MAX_DIMENSION, MAX_SOURCE_SIZE
+from live_updates import LiveUpdates, encode_event
+from sessions import create_session_store, SESSION_COOKIE
+from importer import BulkImporter, REQUIRED as IMPORT_KINDS, BATCH_SIZE as IMPORT_BATCH_SIZE, detect_format, import_status
+from exporter import Exporter, COLUMNS as EXPORT_COLLECTIONS, EXPORT_BATCH_SIZE
+from jobs import create_job_queue, public as public_job
+from rendering import Templates
+from http_cache import http_cache
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import Optional
-from io import BytesIO
-import gridfs
+import os
+import hashlib
+import tempfile
+import mimetypes
+import asyncio
+import copy
 from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from PIL import UnidentifiedImageError
 
 # -------------------------
 # Jinja2 and Helpers
 # -------------------------
 
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 
 # Custom filter to format dates in templates
-def datetimeformat(value, format_str: str = "%d/%m/%Y"):  # noqa: A002
-    return value.strftime(format_str)
-
-templates.env.filters["datetimeformat"] = datetimeformat
+DATE_FORMATS = {"short": "%d/%m/%Y", "time": "%H:%M", "full": "%d/%m/%Y %H:%M"}
+
+def datetimeformat(value, format_str: str = "short"):  # noqa: A002
+    if not value:
+        return ""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.strftime(DATE_FORMATS.get(format_str, format_str))
+
+templates.add_filter("datetimeformat", datetimeformat)
+
+def to_dict(obj):
+    """Recursively convert ObjectIds to strings so documents can be returned as JSON."""
+    if isinstance(obj, dict):
+        return {k: to_dict(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [to_dict(v) for v in obj]
+    elif isinstance(obj, ObjectId):
+        return str(obj)
+    return obj
 
 # Helper to build active menu items by user type
 def menu_active(user_type: str) -> dict:
@@ -52,7 +92,30 @@ def menu_active(user_type: str) -> dict:
 db_conn = MongoDBConnection()
 db = UserService(db_conn=db_conn)
 svc = ServiceManager(db_conn=db_conn)
-fs = gridfs.GridFS(db_conn.db)  # Use the actual Database instance
+contracts = ContractManager(db_conn=db_conn)
+metrics_svc = MetricsService(db_conn=db_conn)
+fs = db_conn.fs  # AsyncGridFS bound to the same database
+storage = FileStorage(db_conn)
+thumbnails = ThumbnailCache()
+live_updates = LiveUpdates(db_conn)
+sessions = create_session_store(db_conn)  # None: JWT only (SESSION_BACKEND=jwt)
+jobs = create_job_queue(db_conn)  # JOB_BACKEND=memory | mongo
+
+async def current_user(request: Request) -> Optional[dict]:
+    """
+    Resolve the session (or, without a session backend, decode the JWT
+    cookie) once per request and return the user profile (id, username,
+    name, type, role), or None when not logged in.
+    """
+    if sessions is not None:
+        session_id = request.cookies.get(SESSION_COOKIE)
+        session = await sessions.get(session_id) if session_id else None
+        return session["profile"] if session else None
+    token = request.cookies.get("access_token")
+    user_id = verify_token(token) if token else None
+    if not user_id:
+        return None
+    return await db.get_profile(user_id)
 
 # Create API router
 router = APIRouter()
@@ -68,34 +131,201 @@ async def upload_file(
 ):
     """
     Upload a file to GridFS and return its ID.
+    Identical content is stored once and shared (see FileStorage).
     """
-    data = await file.read()
-    file_id = fs.put(data, filename=file.filename)
-    return {"filename": file.filename, "file_id": str(file_id)}
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Arquivo muito grande")
+    try:
+        stored = await storage.store(file, file.filename, content_type=file.content_type)
+    except FileTooLargeError:
+        raise HTTPException(status_code=413, detail="Arquivo muito grande")
+    return {
+        "filename": file.filename,
+        "file_id": str(stored["file_id"]),
+        "sha256": stored["sha256"],
+        "size": stored["size"],
+        "deduplicated": stored["deduplicated"]
+    }
 
-@router.get("/download/{file_id}")
-async def download_file(file_id: str):
+def _parse_range(header: str, length: int) -> Optional[tuple]:
     """
-    Download a file from GridFS by its ID.
+    Parse a single-range ``Range: bytes=start-end`` header.
+    Returns (start, end) inclusive, or None when it can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            # Suffix range: the last N bytes
+            suffix = int(end)
+            if suffix <= 0:
+                return None
+            return max(length - suffix, 0), length - 1
+        first = int(start)
+        last = int(end) if end else length - 1
+    except ValueError:
+        return None
+    if first >= length or last < first:
+        return None
+    return first, min(last, length - 1)
+
+async def _iter_grid_out(grid_out, start: int, end: int):
+    # Reads one GridFS chunk at a time so memory stays flat per download
+    await grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(grid_out.chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+def _media_type(grid_out) -> str:
+    return (
+        (grid_out.metadata or {}).get("content_type")
+        or grid_out.content_type
+        or mimetypes.guess_type(grid_out.filename or "")[0]
+        or "application/octet-stream"
+    )
+
+async def gridfs_response(request: Request, file_id: str, attachment: bool = False):
+    """
+    Stream a GridFS file with ETag/Last-Modified validators, 304 on
+    conditional GETs and single-range (206) support.
     """
-    grid_out = fs.get(ObjectId(file_id))
-    stream = BytesIO(grid_out.read())
+    try:
+        grid_out = await fs.get(ObjectId(file_id))
+    except (InvalidId, NoFile):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    metadata = grid_out.metadata or {}
+    digest = (
+        metadata.get("hash_contract")
+        or metadata.get("sha256")
+        or grid_out.md5
+        or f"{grid_out._id}-{grid_out.length}"
+    )
+    etag = f'"{digest}"'
+    upload_date = grid_out.upload_date.replace(tzinfo=timezone.utc)
+    media_type = _media_type(grid_out)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(upload_date, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+    if attachment:
+        headers["Content-Disposition"] = f'attachment; filename="{grid_out.filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            if upload_date.replace(microsecond=0) <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    length = grid_out.length
+    start, end = 0, length - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and length and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, length)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{length}"})
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+
+    headers["Content-Length"] = str(max(end - start + 1, 0))
     return StreamingResponse(
-        stream,
-        media_type="application/octet-stream",
-        headers={
-            "Content-Disposition": f"attachment; filename={grid_out.filename}"
-        }
+        _iter_grid_out(grid_out, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
     )
 
+@router.get("/download/{file_id}")
+@http_cache(compress=False, etag=False)
+async def download_file(request: Request, file_id: str):
+    """
+    Download a file from GridFS by its ID.
+    """
+    return await gridfs_response(request, file_id, attachment=True)
+
 @router.get("/image/{file_id}")
-async def get_image(file_id: str):
+@http_cache(compress=False, etag=False)
+async def get_image(request: Request, file_id: str):
     """
     Serve an image stored in GridFS by its ID.
     """
-    grid_out = fs.get(ObjectId(file_id))
-    stream = BytesIO(grid_out.read())
-    return StreamingResponse(stream, media_type="image/jpeg")
+    return await gridfs_response(request, file_id)
+
+@router.get("/image/{file_id}/thumbnail")
+@http_cache(compress=False, etag=False)
+async def get_thumbnail(
+    file_id: str,
+    w: int = 320,
+    h: int = 0,
+    format: str = "webp",  # noqa: A002
+    q: int = 80,
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Serve a resized variant of a GridFS image. Variants are generated once
+    and then served from the thumbnail cache. Only images up to
+    MAX_SOURCE_SIZE are read to build a variant.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    image_format = format.lower()
+    if image_format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato inválido")
+    if not (0 <= w <= MAX_DIMENSION and 0 <= h <= MAX_DIMENSION) or not (w or h) or not 1 <= q <= 95:
+        raise HTTPException(status_code=400, detail="Parâmetros inválidos")
+
+    async def load_original() -> bytes:
+        grid_out = await fs.get(ObjectId(file_id))
+        # Checked before reading: the whole original is held in memory to resize it
+        if not _media_type(grid_out).startswith("image/"):
+            raise HTTPException(status_code=415, detail="O arquivo não é uma imagem")
+        if grid_out.length > MAX_SOURCE_SIZE:
+            raise HTTPException(status_code=413, detail="Imagem muito grande")
+        return await grid_out.read()
+
+    path = thumbnails.path_for(file_id, w, h, image_format, q)
+    try:
+        # Opened here, not by FileResponse: eviction may remove the path at any time
+        variant = await thumbnails.open_variant(path, load_original, w, h, image_format, q)
+    except (InvalidId, NoFile):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=415, detail="O arquivo não é uma imagem")
+
+    return StreamingResponse(
+        _iter_file(variant),
+        media_type=THUMBNAIL_FORMATS[image_format][1],
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Content-Length": str(os.fstat(variant.fileno()).st_size),
+        }
+    )
+
+async def _iter_file(f):
+    # Reads an already open file in a thread and closes it at the end
+    try:
+        while chunk := await asyncio.to_thread(f.read, UPLOAD_READ_SIZE):
+            yield chunk
+    finally:
+        f.close()
 
 # -------------------------
 # Authentication Routes
@@ -104,8 +334,7 @@ async def get_image(file_id: str):
 @router.get("/", response_class=HTMLResponse)
 async def login_get(request: Request):
     """Render the login page or redirect if already logged in."""
-    token = request.cookies.get("access_token")
-    if token and verify_token(token):
+    if await current_user(request):
         return RedirectResponse(url="/dashboard", status_code=302)
     return templates.TemplateResponse("login.html", {"request": request})
 
@@ -119,8 +348,8 @@ async def login_post(
     """
     Process login form, set JWT cookie on success.
     """
-    user_doc = db.find_user(username)
-    if not user_doc or not PasswordHasher.check_password(
+    user_doc = await db.find_user(username)
+    if not user_doc or not await PasswordHasher.check_password(
         password, user_doc["user"]["senha"]
     ):
         return templates.TemplateResponse(
@@ -128,11 +357,23 @@ async def login_post(
             {"request": request, "error": "Usuário ou senha incorretos"}
         )
 
-    token = create_token({"sub": str(user_doc["_id"])})
+    # Re-hash transparently when the configured bcrypt cost changed
+    if PasswordHasher.needs_rehash(user_doc["user"]["senha"]):
+        await db.update_password(
+            user_doc["_id"], await PasswordHasher.hash_password(password)
+        )
+
     response = RedirectResponse(url="/dashboard", status_code=302)
     max_age = (60 * 60 * 24 * 30) if manter_conectado else 60
+    if sessions is not None:
+        profile = await db.get_profile(str(user_doc["_id"]))
+        cookie = SESSION_COOKIE
+        token = await sessions.create(profile, persistent=bool(manter_conectado))
+    else:
+        cookie = "access_token"
+        token = create_token({"sub": str(user_doc["_id"])})
     response.set_cookie(
-        key="access_token",
+        key=cookie,
         value=token,
         httponly=True,
         max_age=max_age,
@@ -146,26 +387,21 @@ async def login_post(
 # -------------------------
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request):
+async def dashboard(request: Request, user: Optional[dict] = Depends(current_user)):
     """Render the user dashboard, requires valid JWT cookie."""
-    token = request.cookies.get("access_token")
-    if not token or not verify_token(token):
+    if not user:
         return RedirectResponse(url="/", status_code=302)
 
-    user_id = verify_token(token)
-    user_data = db.find_user(user_id)["user"]
-    menu = menu_active(user_data["tipo"])
+    menu = menu_active(user["type"])
+    metrics = await metrics_svc.get_dashboard(user)
 
-    # Compute dashboard stats...
     ctx = {
         "request": request,
-        "user": {
-            "name": user_data["nome"],
-            "type": user_data["tipo"],
-            "role": user_data["cargo"]
-        },
+        "user": user,
         "menu": menu,
-        # add other context values here
+        **metrics,
+        "faturamento_valor": f"R${metrics['faturamento']:,.0f}".replace(",", "."),
+        "meta_faturamento_valor": f"R${metrics['meta_faturamento']:,.0f}".replace(",", "."),
     }
     return templates.TemplateResponse("dashboard.html", ctx)
 
@@ -176,17 +412,20 @@ async def dashboard(request: Request):
 @router.get("/services", response_class=HTMLResponse)
 async def list_services(
     request: Request,
-    user: dict = Depends(get_logged_user)
+    status: str = "PENDENTE",
+    tipo: Optional[str] = None,
+    cliente: Optional[str] = None,
+    de: Optional[str] = None,
+    ate: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    user: Optional[dict] = Depends(current_user)
 ):
-    """List all services with actions based on user role."""
-
-    token = request.cookies.get("access_token")
-    if not token or not verify_token(token):
+    """List services page by page, with actions based on user role."""
+    if not user:
         return RedirectResponse(url="/", status_code=302)
 
-    user_id = verify_token(token)
-    user_data = user_data = db.find_user(user_id)["user"]
-    user_type = user_data["tipo"]
+    user_type = user["type"]
     actions = {
         "add": user_type == "Admin",
         "edit": user_type == "Admin",
@@ -196,68 +435,460 @@ async def list_services(
         "request_service": user_type == "cliente"
     }
 
-    services_pendents = [s for s in svc.collection.find({"servico.status": "PENDENTE"})]
-    services = list(svc.collection.find())
-    return templates.TemplateResponse(
+    page = await svc.list_services(
+        status=status,
+        tipo=tipo,
+        client_id=cliente,
+        date_from=de,
+        date_to=ate,
+        cursor=cursor,
+        limit=max(1, min(limit, 100))
+    )
+    if page["status_code"] != 200:
+        raise HTTPException(status_code=page["status_code"], detail=page["message"])
+
+    next_url = None
+    if page["next_cursor"]:
+        next_url = str(request.url.include_query_params(cursor=page["next_cursor"]))
+    # Streamed so the first bytes go out before all cards are rendered
+    return templates.stream(
         "services.html",
-        {"request": request, "services": services, "actions": actions, "menu": menu_active(user_type), "services": list(services_pendents)}
+        {"request": request, "services": page["data"], "actions": actions, "menu": menu_active(user_type), "next_url": next_url}
     )
 
 @router.get("/services/{service_id}", response_class=HTMLResponse)
 async def view_service(
     request: Request,
     service_id: str,
-    user: dict = Depends(get_logged_user)
+    user: Optional[dict] = Depends(current_user)
 ):
-    
-    token = request.cookies.get("access_token")
-    if not token or not verify_token(token):
+    """View details of a single service."""
+    if not user:
         return RedirectResponse(url="/", status_code=302)
 
-    user_id = verify_token(token)
-    user_data = user_data = db.find_user(user_id)["user"]
-
-    """View details of a single service."""
-    service_doc = svc.get_service(service_id)
+    service_doc = await svc.get_service(service_id)
     if not service_doc["data"]:
         raise HTTPException(status_code=404, detail="Serviço não encontrado")
     return templates.TemplateResponse(
         "view_service.html",
-        {"request": request, "service": service_doc["data"], "menu": menu_active(user_data["tipo"]), "user": user}
+        {"request": request, "service": service_doc["data"], "menu": menu_active(user["type"]), "user": user}
     )
 
 @router.get("/services/{service_id}/accept")
 async def accept_service(
     request: Request,
     service_id: str,
-    user: dict = Depends(get_logged_user)
+    user: Optional[dict] = Depends(current_user)
 ):
-   # 1) Decodifica o cookie
-    token = request.cookies.get("access_token")
-    user_id = verify_token(token)
-    if not user_id:
+    # 1) Usuário logado (cookie decodificado uma única vez)
+    if not user:
         return RedirectResponse(url="/", status_code=302)
 
-    # 2) Atualiza o serviço no MongoDB
-    # Como o documento de serviço está dentro de {"servico": {..., "status": ...}}, usamos operador $set aninhado
-    svc_update = svc.update_service(
-        service_id,
-        {"servico.status": "EM ANDAMENTO"}
+    # 2) Aceita o serviço: troca de status condicional (só se PENDENTE) e
+    # atribuição ao usuário na mesma transação
+    result = await svc.accept_service(service_id, user["id"])
+    if result["status_code"] in (404, 409):
+        raise HTTPException(status_code=result["status_code"], detail=result["message"])
+    if result["status_code"] != 200:
+        raise HTTPException(status_code=500, detail="Erro ao aceitar serviço")
+
+    # 3) Redireciona de volta para a lista de serviços ou dashboard
+    return RedirectResponse(url="/services", status_code=302)
+
+@router.get("/events")
+@http_cache(compress=False, etag=False)
+async def service_events(
+    request: Request,
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Server-Sent Events with live changes to services and tickets,
+    filtered by the user's role.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    queue = live_updates.subscribe(user)
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so proxies don't close the connection
+                    yield ": ping\n\n"
+                    continue
+                yield encode_event(event)
+        finally:
+            live_updates.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    if svc_update["status_code"] != 200:
-        raise HTTPException(status_code=500, detail="Erro ao atualizar status do serviço")
 
-    # 3) Adiciona esse serviço no services_info do usuário
-    user_update = db.add_service_info(user_id, service_id)
-    if user_update["status_code"] != 200:
-        raise HTTPException(status_code=500, detail=f"Erro ao registrar serviço para o usuário {user_update}")
+# -------------------------
+# Users Routes
+# -------------------------
 
-    # 4) Redireciona de volta para a lista de serviços ou dashboard
-    return RedirectResponse(url="/services", status_code=302)
+@router.post("/users/bulk")
+async def bulk_register_users(
+    response: Response,
+    users: list[dict] = Body(...),
+    background: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Register many users at once (e.g. a whole client company).
+    Returns a per-row report in the same order as the input, or with
+    ``background=true`` a 202 and a job whose result is that report.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    if background:
+        # O payload fica gravado na coleção jobs: a senha em texto puro nunca entra nele
+        await db.hash_passwords(users)
+        job = await jobs.enqueue("users.bulk", {"users": users}, idempotency_key=idempotency_key, owner=user["id"])
+        return job_accepted(response, job)
+    return await db.add_users(users)
+
+@jobs.handler("users.bulk")
+async def bulk_register_users_job(job: dict) -> dict:
+    # add_users recebe o _id nos próprios documentos; a cópia mantém o
+    # payload intacto para uma nova tentativa
+    result = await db.add_users(copy.deepcopy(job["payload"]["users"]), hashed=True)
+    if result["status_code"] >= 500:
+        raise RuntimeError(result.get("erro") or result["message"])
+    return result
+
+CPF_VALIDATE_MAX_ROWS = int(os.getenv("CPF_VALIDATE_MAX_ROWS", "100000"))
+
+@router.post("/users/cpf/validate")
+async def validate_cpfs(
+    cpfs: list[Optional[str | int]] = Body(...),
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Validate a whole spreadsheet column of CPFs before importing it.
+    Returns the counts and, for each invalid row, its index and reason.
+    At most CPF_VALIDATE_MAX_ROWS rows per request.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if len(cpfs) > CPF_VALIDATE_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {CPF_VALIDATE_MAX_ROWS} linhas por pedido")
+    valid, reasons = verify_cpf_batch(cpfs)
+    invalid = (~valid).nonzero()[0]
+    return {
+        "total": len(cpfs),
+        "validos": int(valid.sum()),
+        "invalidos": [
+            {"row": int(row), "cpf": cpfs[row], "motivo": CPF_REASONS[reasons[row]]}
+            for row in invalid
+        ],
+    }
+
+@router.post("/users/{user_id}/sessions/revoke")
+async def revoke_user_sessions(
+    user_id: str,
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Log a user out everywhere (e.g. stolen cookie). Requires a session
+    backend; pure JWT cookies stay valid until they expire.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    if sessions is None:
+        raise HTTPException(status_code=501, detail="SESSION_BACKEND não configurado")
+    return {"revogadas": await sessions.revoke_user(user_id)}
+
+@router.get("/users/me/contracts")
+async def my_contracts(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    user: Optional[dict] = Depends(current_user)
+):
+    """Page through the logged user's contracts."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    page = await contracts.list_contracts(user["id"], cursor, max(1, min(limit, 100)))
+    if page["status_code"] != 200:
+        raise HTTPException(status_code=page["status_code"], detail=page["message"])
+    return to_dict(page)
+
+@router.get("/users/me/services")
+async def my_services(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    user: Optional[dict] = Depends(current_user)
+):
+    """Page through the services assigned to the logged user."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    page = await db.list_service_info(user["id"], cursor, max(1, min(limit, 100)))
+    if page["status_code"] != 200:
+        raise HTTPException(status_code=page["status_code"], detail=page["message"])
+    return to_dict(page)
 
 @router.get("/logout")
-async def logout():
-    """Clear auth cookie and redirect to login."""
+async def logout(request: Request):
+    """Revoke the server-side session, clear auth cookies and redirect to login."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if sessions is not None and session_id:
+        await sessions.revoke(session_id)
     response = RedirectResponse(url="/", status_code=302)
     response.delete_cookie("access_token")
+    response.delete_cookie(SESSION_COOKIE)
     return response
+
+# -------------------------
+# Background Jobs
+# -------------------------
+
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "connecta-jobs"))
+
+def job_accepted(response: Response, job: dict) -> dict:
+    """202 body for routes that hand their work to the job queue."""
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job['_id']}"
+    return {"job_id": job["_id"], "status": job["status"], "status_url": f"/jobs/{job['_id']}"}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: Optional[dict] = Depends(current_user)):
+    """Status, attempts and (once done) result of a background job."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    job = await jobs.get(job_id)
+    if not job or (job.get("owner") != user["id"] and user["type"] != "Admin"):
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return to_dict(public_job(job))
+
+class _FileReader:
+    """``async read(size)`` over a local file, as FileStorage.store expects."""
+    def __init__(self, f):
+        self.f = f
+
+    async def read(self, size: int) -> bytes:
+        return await asyncio.to_thread(self.f.read, size)
+
+@router.post("/contracts")
+async def create_contract(
+    response: Response,
+    user_identifier: str = Form(...),
+    nome: str = Form(...),
+    valor: float = Form(...),
+    data_de_vencimento: str = Form(...),
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None),
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Create a contract for a client. The upload is spooled to disk and the
+    hashing and GridFS write run as a background job (202 + job to poll).
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    try:
+        vencimento = datetime.fromisoformat(data_de_vencimento)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data de vencimento inválida")
+
+    # Com JOB_BACKEND=mongo e vários hosts, JOB_DIR precisa ser compartilhado
+    os.makedirs(JOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=JOB_DIR, suffix=".upload")
+    size = 0
+    with os.fdopen(fd, "wb") as out:
+        while chunk := await file.read(UPLOAD_READ_SIZE):
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                out.close()
+                os.remove(path)
+                raise HTTPException(status_code=413, detail="Arquivo muito grande")
+            await asyncio.to_thread(out.write, chunk)
+
+    job = await jobs.enqueue(
+        "contracts.add",
+        {
+            "user_identifier": user_identifier,
+            "contrato": {"nome": nome, "valor": valor, "data_de_vencimento": vencimento},
+            "path": path,
+            "filename": os.path.basename(file.filename or "contrato"),
+        },
+        idempotency_key=idempotency_key,
+        owner=user["id"]
+    )
+    if (job.get("payload") or {}).get("path") != path:
+        # Pedido repetido (mesma Idempotency-Key): o job existente já tem o arquivo
+        os.remove(path)
+    return job_accepted(response, job)
+
+async def remove_contract_upload(job: dict) -> None:
+    # Falha definitiva (tentativas esgotadas, timeout, worker interrompido)
+    path = job["payload"]["path"]
+    if os.path.exists(path):
+        os.remove(path)
+
+@jobs.handler("contracts.add", on_failure=remove_contract_upload)
+async def add_contract_job(job: dict) -> dict:
+    payload = job["payload"]
+    with open(payload["path"], "rb") as f:
+        result = await contracts.add_contract(
+            payload["user_identifier"], payload["contrato"], _FileReader(f), payload["filename"]
+        )
+    if result["status_code"] >= 500:
+        raise RuntimeError(result.get("erro") or result["message"])
+    os.remove(payload["path"])
+    return result
+
+# -------------------------
+# Bulk Imports
+# -------------------------
+
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(tempfile.gettempdir(), "connecta-imports"))
+running_imports = {}  # import_id -> asyncio.Task
+
+@router.post("/imports/{kind}", status_code=202)
+async def start_import(
+    kind: str,
+    file: UploadFile = File(...),
+    batch_size: int = IMPORT_BATCH_SIZE,
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Stream a CSV/JSONL upload (users, services or contracts) to disk and
+    import it in the background. Uploading the same file again resumes
+    from its checkpoint instead of starting over.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    if kind not in IMPORT_KINDS:
+        raise HTTPException(status_code=404, detail="Tipo de importação inválido")
+    try:
+        file_format = detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Copia em partes, calculando o hash que identifica a importação
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=IMPORT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as out:
+        while chunk := await file.read(UPLOAD_READ_SIZE):
+            sha256.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    import_id = f"{kind}-{sha256.hexdigest()[:16]}"
+    path = os.path.join(IMPORT_DIR, f"{import_id}.{file_format}")
+    os.replace(tmp_path, path)
+
+    if import_id not in running_imports:
+        importer = BulkImporter(db_conn, kind, batch_size=max(1, min(batch_size, 5000)))
+        task = asyncio.create_task(importer.run(path, file_format, import_id))
+        running_imports[import_id] = task
+
+        def finished(task):
+            running_imports.pop(import_id, None)
+            # A falha já fica registrada no checkpoint da importação
+            if not task.cancelled() and task.exception():
+                print(f"❌ Importação {import_id} falhou:", task.exception())
+        task.add_done_callback(finished)
+
+    return {"import_id": import_id, "status_url": f"/imports/{import_id}"}
+
+@router.get("/imports/{import_id}")
+async def get_import(import_id: str, user: Optional[dict] = Depends(current_user)):
+    """Progress and counters of an import."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    status = await import_status(db_conn, import_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    status["em_execucao"] = import_id in running_imports
+    status.pop("rejeitos", None)
+    return to_dict(status)
+
+@router.get("/imports/{import_id}/rejects")
+async def get_import_rejects(import_id: str, user: Optional[dict] = Depends(current_user)):
+    """Download the rejected rows (JSONL, one reason per row)."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    status = await import_status(db_conn, import_id)
+    if not status or not os.path.exists(status.get("rejeitos") or ""):
+        raise HTTPException(status_code=404, detail="Sem rejeitos para esta importação")
+    return FileResponse(status["rejeitos"], media_type="application/x-ndjson", filename=f"{import_id}.rejects.jsonl")
+
+# -------------------------
+# Bulk Exports
+# -------------------------
+
+@router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = "csv",
+    batch_size: int = EXPORT_BATCH_SIZE,
+    files: bool = False,
+    user: Optional[dict] = Depends(current_user)
+):
+    """
+    Stream services, tickets or contracts as CSV, JSONL or Parquet.
+    With ``files=true`` the export is zipped on the fly; for contracts the
+    zip also carries the stored contract files.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Coleção não exportável")
+    try:
+        exporter = Exporter(db_conn, collection, format, batch_size=max(1, min(batch_size, 10000)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if files:
+        filename = f"{collection}.zip"
+        body, media_type = exporter.stream_zip(), "application/zip"
+    else:
+        filename, body, media_type = exporter.filename, exporter.stream(), exporter.media_type
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# -------------------------
+# Health
+# -------------------------
+
+@router.get("/health/db")
+async def db_pool_stats(user: Optional[dict] = Depends(current_user)):
+    """Connection pool stats (checked-out, wait time, wait-queue depth). Admin only."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    return db_conn.stats()
+
+@router.get("/health/jobs")
+async def job_queue_stats(user: Optional[dict] = Depends(current_user)):
+    """Job queue depth and per-job counters and latencies (wait and run). Admin only."""
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user["type"] != "Admin":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+    return await jobs.stats()
@@ -0,0 +1,167 @@
+import os
+import gzip
+import hashlib
+import tempfile
+from fastapi.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    # Sem o pacote brotli, só as variantes gzip são geradas
+    brotli = None
+
+STATIC_DIR = "app/static"
+STATIC_URL = "/static/"
+THEMES = ("light", "dark")
+
+# Tipos textuais que valem a pena comprimir; PNG/JPEG já são comprimidos
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Vários workers podem construir ao mesmo tempo; o rename evita arquivo parcial
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+def accepted_encoding(scope, available) -> str:
+    """
+    Escolhe, entre as codificações disponíveis, a preferida pelo cliente
+    (brotli antes de gzip). Retorna None se nenhuma for aceita.
+    """
+    accepted = ""
+    for key, value in scope["headers"]:
+        if key == b"accept-encoding":
+            accepted = value.decode("latin-1").lower()
+    offered = {
+        item.split(";")[0].strip() for item in accepted.split(",")
+        if item.replace(" ", "").split(";q=")[-1] not in ("0", "0.0", "0.00", "0.000")
+    }
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in offered:
+            return encoding
+    return None
+
+def fingerprint(path: str, data: bytes) -> str:
+    """``css/base.css`` -> ``css/base.<hash>.css``"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+class AssetPipeline:
+    """
+    Gera, na subida da aplicação, cópias dos arquivos estáticos com o hash
+    do conteúdo no nome, mais variantes gzip/brotli pré-comprimidas.
+
+    Como o nome muda sempre que o conteúdo muda, essas cópias podem ser
+    servidas com ``Cache-Control: immutable`` e o navegador não precisa
+    revalidá-las. Os templates obtêm as URLs por ``static_url()``.
+    """
+    def __init__(self, directory: str = STATIC_DIR, build_dir: str = None, bundle_css: bool = None):
+        self.directory = directory
+        self.build_dir = build_dir or os.getenv(
+            "STATIC_BUILD_DIR", os.path.join(tempfile.gettempdir(), "connecta-static")
+        )
+        if bundle_css is None:
+            bundle_css = os.getenv("STATIC_BUNDLE_CSS", "false").lower() == "true"
+        self.bundle_css = bundle_css
+        self.manifest = {}
+        self.encodings = {}
+        os.makedirs(self.build_dir, exist_ok=True)
+
+    def build(self) -> dict:
+        manifest, encodings = {}, {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    self._emit(path, f.read(), manifest, encodings)
+
+        if self.bundle_css:
+            # base.css + tema em um único arquivo por tema: uma requisição a menos por página
+            with open(os.path.join(self.directory, "css", "base.css"), "rb") as f:
+                base = f.read()
+            for theme in THEMES:
+                with open(os.path.join(self.directory, "css", f"theme-{theme}.css"), "rb") as f:
+                    self._emit(f"css/bundle-{theme}.css", base + b"\n" + f.read(), manifest, encodings)
+
+        self.manifest, self.encodings = manifest, encodings
+        self._prune()
+        return manifest
+
+    def _emit(self, path: str, data: bytes, manifest: dict, encodings: dict) -> None:
+        name = fingerprint(path, data)
+        manifest[path] = name
+        encodings[name] = {}
+        target = os.path.join(self.build_dir, name)
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+
+        if os.path.splitext(path)[1] not in COMPRESSIBLE or len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {"gzip": (".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            variants["br"] = (".br", lambda: brotli.compress(data, quality=11))
+        for encoding, (suffix, compress) in variants.items():
+            if not os.path.exists(target + suffix):
+                compressed = compress()
+                if len(compressed) >= len(data):
+                    continue
+                _write_atomic(target + suffix, compressed)
+            encodings[name][encoding] = name + suffix
+
+    def _prune(self) -> None:
+        # Remove o que sobrou de builds anteriores (conteúdo que não existe mais)
+        keep = set(self.manifest.values())
+        for variants in self.encodings.values():
+            keep.update(variants.values())
+        for root, _, files in os.walk(self.build_dir):
+            for name in files:
+                path = os.path.relpath(os.path.join(root, name), self.build_dir).replace(os.sep, "/")
+                if path not in keep and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except FileNotFoundError:
+                        pass
+
+    def url(self, path: str) -> str:
+        # Antes do build (ou para arquivos desconhecidos) usa o caminho original
+        return STATIC_URL + self.manifest.get(path, path)
+
+    def theme_css(self, theme: str) -> str:
+        if self.bundle_css:
+            return self.url(f"css/bundle-{theme}.css")
+        return self.url(f"css/theme-{theme}.css")
+
+    def files(self) -> "AssetFiles":
+        return AssetFiles(self)
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles que serve as cópias com hash (imutáveis, pré-comprimidas)
+    e, como alternativa, os arquivos originais pelo caminho de sempre.
+    """
+    def __init__(self, pipeline: AssetPipeline):
+        super().__init__(directory=pipeline.build_dir)
+        self.all_directories.append(pipeline.directory)
+        self.pipeline = pipeline
+
+    async def get_response(self, path: str, scope):
+        variants = self.pipeline.encodings.get(path)
+        if variants is None:
+            return await super().get_response(path, scope)
+
+        encoding = accepted_encoding(scope, variants)
+        response = await super().get_response(variants[encoding] if encoding else path, scope)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if variants:
+            response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+# Instância usada pela aplicação e pelos templates
+static_assets = AssetPipeline()
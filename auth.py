@@ -1,9 +1,14 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, UTC
 import os
+import time
+import hashlib
 from fastapi import Request, HTTPException
 import re
+import numbers
+import numpy as np
 from dotenv import load_dotenv
+from cache import TTLCache
 
 load_dotenv()
 
@@ -11,6 +16,32 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
+def _load_keys() -> dict:
+    """
+    Chaves de assinatura aceitas, por ``kid``. ``JWT_KEYS`` tem o formato
+    ``kid1:segredo1,kid2:segredo2``; sem ela, SECRET_KEY vira o kid "default".
+
+    Para trocar a chave: adicione a nova em JWT_KEYS, aponte JWT_ACTIVE_KID
+    para ela e mantenha a antiga até os tokens emitidos com ela expirarem.
+    """
+    keys = {}
+    for item in os.getenv("JWT_KEYS", "").split(","):
+        kid, _, secret = item.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret
+    if not keys and SECRET_KEY:
+        keys["default"] = SECRET_KEY
+    return keys
+
+SIGNING_KEYS = _load_keys()
+ACTIVE_KID = os.getenv("JWT_ACTIVE_KID") or next(iter(SIGNING_KEYS), None)
+
+# Tokens já verificados, pelo hash do token; cada item expira junto com o "exp"
+verified_tokens = TTLCache(
+    maxsize=int(os.getenv("JWT_CACHE_SIZE", "10000")),
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
 def verify_cpf(cpf: str) -> bool:
     # Remover caracteres não numéricos
     cpf = re.sub(r'[^0-9]', '', cpf)
@@ -26,7 +57,7 @@ def verify_cpf(cpf: str) -> bool:
     # Função para calcular o dígito verificador
     def calc_remainder(cpf_parcial: str) -> str:
         initial_length = len(cpf_parcial) + 1
-        soma = sum(int(d) * (initial_length - idx) for idx, d in enumerate(cpf_parcial, start=1))
+        soma = sum(int(d) * (initial_length - idx) for idx, d in enumerate(cpf_parcial))
         resto = soma % 11
         return "0" if resto < 2 else str(11 - resto)
     
@@ -38,19 +69,102 @@ def verify_cpf(cpf: str) -> bool:
     return cpf[-2:] == digito_1 + digito_2
     print("teste 7")
 
+# Códigos de motivo de verify_cpf_batch; o código é o índice nesta tupla
+CPF_REASONS = ("ok", "tamanho_invalido", "digitos_repetidos", "dv1_invalido", "dv2_invalido")
+CPF_OK, CPF_BAD_LENGTH, CPF_REPEATED, CPF_BAD_DV1, CPF_BAD_DV2 = range(len(CPF_REASONS))
+
+# Pesos dos dígitos verificadores: coluna 0 -> DV1 (10..2), coluna 1 -> DV2 (11..3);
+# o DV2 ainda soma 2 x DV1
+CPF_WEIGHTS = np.stack([np.arange(10, 1, -1), np.arange(11, 2, -1)], axis=1)
+# "000.000.000-00": células maiores não são CPF e nem entram na matriz de caracteres
+CPF_MAX_TEXT = 14
+
+def _cpf_text(cpf) -> str:
+    if cpf is None:
+        return ""
+    # Planilhas costumam guardar CPF como número e perder os zeros à esquerda
+    if isinstance(cpf, numbers.Integral):
+        return f"{int(cpf):011d}"
+    return str(cpf)
+
+def verify_cpf_batch(cpfs) -> tuple:
+    """
+    Valida muitos CPFs de uma vez (lista, coluna de planilha, array...).
+
+    Retorna ``(validos, motivos)``: uma máscara booleana e um array com o
+    código de cada linha (índice em CPF_REASONS). Mesma regra de
+    verify_cpf, mas com os dígitos verificadores calculados em bloco;
+    células com mais de CPF_MAX_TEXT caracteres contam como tamanho inválido.
+    """
+    texts = [_cpf_text(cpf) for cpf in cpfs]
+    reasons = np.full(len(texts), CPF_BAD_LENGTH, dtype=np.uint8)
+    # A largura da matriz é fixa: uma célula enorme não pode dimensionar o lote todo
+    rows = np.array([i for i, text in enumerate(texts) if len(text) <= CPF_MAX_TEXT], dtype=np.intp)
+    if len(rows) == 0:
+        return reasons == CPF_OK, reasons
+
+    # Cada string vira uma linha de code points; tudo que não é dígito é descartado
+    chars = (
+        np.array([texts[i] for i in rows], dtype=f"<U{CPF_MAX_TEXT}")
+        .view(np.uint32).reshape(len(rows), CPF_MAX_TEXT)
+    )
+    is_digit = (chars >= 48) & (chars <= 57)
+    sized = is_digit.sum(axis=1) == 11
+
+    # Ordenação estável que leva os dígitos para o início, na ordem original
+    order = np.argsort(~is_digit[sized], axis=1, kind="stable")[:, :11]
+    digits = (np.take_along_axis(chars[sized], order, axis=1) - 48).astype(np.int64)
+
+    sums = digits[:, :9] @ CPF_WEIGHTS
+    rest = sums[:, 0] % 11
+    dv1 = np.where(rest < 2, 0, 11 - rest)
+    rest = (sums[:, 1] + 2 * dv1) % 11
+    dv2 = np.where(rest < 2, 0, 11 - rest)
+
+    sized_reasons = np.full(len(digits), CPF_OK, dtype=np.uint8)
+    sized_reasons[digits[:, 10] != dv2] = CPF_BAD_DV2
+    sized_reasons[digits[:, 9] != dv1] = CPF_BAD_DV1
+    sized_reasons[(digits == digits[:, :1]).all(axis=1)] = CPF_REPEATED
+    reasons[rows[sized]] = sized_reasons
+    return reasons == CPF_OK, reasons
+
 def create_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    if ACTIVE_KID not in SIGNING_KEYS:
+        raise RuntimeError("Nenhuma chave JWT configurada (SECRET_KEY ou JWT_KEYS)")
+    return jwt.encode(to_encode, SIGNING_KEYS[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID})
 
 def verify_token(token: str):
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = verified_tokens.get(digest)
+    if cached is not None:
+        sub, exp = cached
+        # O TTL usa o relógio monotônico; confere o exp de novo pelo relógio real
+        if exp > time.time():
+            return sub
+        verified_tokens.pop(digest)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        # Tokens emitidos antes da rotação não têm kid e usam SECRET_KEY
+        header = jwt.get_unverified_header(token)
+        # O cabeçalho ainda não foi verificado: kid pode ter qualquer tipo
+        kid = header.get("kid") if isinstance(header, dict) else None
+        if kid is not None and not isinstance(kid, str):
+            return None
+        key = SIGNING_KEYS.get(kid) if kid else SECRET_KEY
+        if key is None:
+            return None
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
+    sub, exp = payload.get("sub"), payload.get("exp")
+    if sub and isinstance(exp, (int, float)):
+        verified_tokens.set(digest, (sub, exp), ttl=exp - time.time())
+    return sub
+
 def get_logged_user(request: Request):
     token = request.cookies.get("access_token")
     if not token:
@@ -0,0 +1,60 @@
+"""
+Compara verify_cpf (um CPF por vez) com verify_cpf_batch (em bloco) sobre
+uma lista sintética com CPFs válidos, formatados, numéricos e inválidos.
+
+    python -m benchmarks.bench_cpf --rows 100000 --repeat 5
+"""
+import sys
+import random
+import timeit
+import argparse
+from auth import verify_cpf, verify_cpf_batch
+
+def _valid_cpf(rng: random.Random) -> str:
+    digits = [rng.randrange(10) for _ in range(9)]
+    for length in (10, 11):
+        soma = sum(d * (length - i) for i, d in enumerate(digits))
+        resto = soma % 11
+        digits.append(0 if resto < 2 else 11 - resto)
+    return "".join(map(str, digits))
+
+def sample(rows: int, seed: int = 42) -> list:
+    """Mistura o que aparece numa planilha real: CPFs limpos, com máscara, numéricos e lixo."""
+    rng = random.Random(seed)
+    cpfs = []
+    for i in range(rows):
+        cpf = _valid_cpf(rng)
+        kind = i % 5
+        if kind == 1:
+            cpf = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+        elif kind == 2:
+            cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+        elif kind == 3:
+            cpf = cpf[:rng.randrange(11)]
+        cpfs.append(cpf)
+    return cpfs
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="verify_cpf x verify_cpf_batch")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cpfs = sample(args.rows)
+    # As duas versões precisam concordar antes de comparar o tempo
+    expected = [verify_cpf(cpf) for cpf in cpfs]
+    valid, _ = verify_cpf_batch(cpfs)
+    if valid.tolist() != expected:
+        print("❌ verify_cpf_batch diverge de verify_cpf")
+        return 1
+
+    single = min(timeit.repeat(lambda: [verify_cpf(cpf) for cpf in cpfs], number=1, repeat=args.repeat))
+    batch = min(timeit.repeat(lambda: verify_cpf_batch(cpfs), number=1, repeat=args.repeat))
+    print(f"{args.rows} CPFs, melhor de {args.repeat}")
+    print(f"  verify_cpf:       {single * 1000:9.1f} ms  ({single / args.rows * 1e6:.2f} µs/CPF)")
+    print(f"  verify_cpf_batch: {batch * 1000:9.1f} ms  ({batch / args.rows * 1e6:.2f} µs/CPF)")
+    print(f"  ganho: {single / batch:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+"""
+Mede o HTTPCacheMiddleware com um cliente ASGI em processo (httpx):
+bytes trafegados e tempo por requisição para uma página HTML de
+serviços e uma lista JSON, sem o middleware, com gzip/brotli e na
+revalidação por ETag (If-None-Match -> 304).
+
+    python -m benchmarks.bench_http_cache --cards 50 --requests 200
+"""
+import sys
+import time
+import asyncio
+import argparse
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+from http_cache import HTTPCacheMiddleware, brotli
+
+def services(cards: int) -> list:
+    return [
+        {
+            "_id": f"{i:024x}",
+            "servico": {
+                "nome": f"Serviço {i}",
+                "tipo": ("Manutenção", "Instalação", "Consultoria")[i % 3],
+                "descricao": "Troca de equipamentos e revisão da rede elétrica do cliente " * 2,
+                "data_de_entrega": f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                "status": ("PENDENTE", "EM ANDAMENTO", "CONCLUIDO")[i % 3],
+            },
+            "cliente_info": {"nome": f"Cliente {i % 7}", "email": f"cliente{i % 7}@exemplo.com"},
+        }
+        for i in range(cards)
+    ]
+
+def card(service: dict) -> str:
+    info, client = service["servico"], service["cliente_info"]
+    return (
+        f'<div class="card service-card" data-id="{service["_id"]}">'
+        f'<div class="card-header"><h5 class="card-title">{info["nome"]}</h5>'
+        f'<span class="badge status">{info["status"]}</span></div>'
+        f'<div class="card-body"><p class="card-text">{info["descricao"]}</p>'
+        f'<ul class="list-unstyled"><li><strong>Tipo:</strong> {info["tipo"]}</li>'
+        f'<li><strong>Entrega:</strong> {info["data_de_entrega"]}</li>'
+        f'<li><strong>Cliente:</strong> {client["nome"]} ({client["email"]})</li></ul>'
+        f'<a class="btn btn-primary" href="/services/{service["_id"]}">Detalhes</a></div></div>\n'
+    )
+
+def build_app(cards: int, middleware: bool):
+    data = services(cards)
+    page = "<html><body><main class=\"container\">" + "".join(map(card, data)) + "</main></body></html>"
+
+    async def html(request):
+        return HTMLResponse(page)
+
+    async def api(request):
+        return JSONResponse(data)
+
+    async def stream(request):
+        async def body():
+            for service in data:
+                yield card(service)
+        return StreamingResponse(body(), media_type="text/html")
+
+    app = Starlette(routes=[Route("/services", html), Route("/api/services", api), Route("/services/stream", stream)])
+    return HTTPCacheMiddleware(app) if middleware else app
+
+async def measure(app, path: str, requests: int, headers: dict, revalidate: bool) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        if revalidate:
+            etag = (await client.get(path, headers=headers)).headers.get("etag")
+            headers = {**headers, "If-None-Match": etag or ""}
+        wire, status = 0, None
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get(path, headers=headers)
+            wire += response.num_bytes_downloaded
+            status = response.status_code
+        elapsed = time.perf_counter() - started
+    return wire / requests, elapsed / requests, status
+
+async def run(args) -> None:
+    plain = build_app(args.cards, middleware=False)
+    cached = build_app(args.cards, middleware=True)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for path in ("/services", "/api/services", "/services/stream"):
+        print(path)
+        cases = [("sem middleware", plain, {"Accept-Encoding": "identity"}, False)]
+        cases += [(encoding, cached, {"Accept-Encoding": encoding}, False) for encoding in encodings]
+        if path != "/services/stream":
+            cases.append(("If-None-Match", cached, {"Accept-Encoding": encodings[-1]}, True))
+        for title, app, headers, revalidate in cases:
+            size, seconds, status = await measure(app, path, args.requests, headers, revalidate)
+            print(f"  {title:15} {status}  {size / 1024:8.1f} kB  {seconds * 1000:7.2f} ms/req")
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="Compressão e ETag do HTTPCacheMiddleware")
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args(argv)
+    print(f"{args.cards} serviços, {args.requests} requisições por caso")
+    asyncio.run(run(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
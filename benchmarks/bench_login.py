@@ -0,0 +1,70 @@
+"""
+Latência do check_password do login (p50/p99) com muitos logins
+simultâneos, no pool do PasswordHasher (BCRYPT_WORKERS threads,
+custo BCRYPT_ROUNDS), e o atraso que isso impõe ao event loop. Para
+comparar, repete com o bcrypt rodando direto no loop.
+
+    BCRYPT_ROUNDS=12 BCRYPT_WORKERS=4 python -m benchmarks.bench_login --logins 64
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from database import PasswordHasher
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+async def _loop_lag(stop: asyncio.Event, lags: list) -> None:
+    # Quanto um sleep curto atrasa: mede o tempo em que o loop ficou bloqueado
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - started - 0.005)
+
+async def _blocking_check(password: str, hashed: bytes) -> bool:
+    return PasswordHasher.check_password_sync(password, hashed)
+
+async def scenario(check, hashed: bytes, logins: int) -> tuple:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_loop_lag(stop, lags))
+    await asyncio.sleep(0.01)
+
+    async def login() -> None:
+        if not await check("senha-do-benchmark", hashed):
+            raise AssertionError("senha recusada")
+        # Todos chegam juntos: a latência conta a espera na fila do pool
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return latencies, lags or [0.0], elapsed
+
+def report(title: str, latencies: list, lags: list, elapsed: float) -> None:
+    print(title)
+    print(f"  p50: {percentile(latencies, 50) * 1000:8.1f} ms   p99: {percentile(latencies, 99) * 1000:8.1f} ms"
+          f"   média: {statistics.mean(latencies) * 1000:8.1f} ms")
+    print(f"  vazão: {len(latencies) / elapsed:6.1f} logins/s   atraso máximo do loop: {max(lags) * 1000:.1f} ms")
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="p50/p99 do check_password no login")
+    parser.add_argument("--logins", type=int, default=64, help="logins simultâneos")
+    parser.add_argument("--no-baseline", action="store_true", help="não mede o bcrypt direto no loop")
+    args = parser.parse_args(argv)
+
+    hashed = PasswordHasher.hash_password_sync("senha-do-benchmark")
+    workers = PasswordHasher._executor._max_workers
+    print(f"{args.logins} logins simultâneos, BCRYPT_ROUNDS={PasswordHasher.rounds}, BCRYPT_WORKERS={workers}")
+    report("pool do PasswordHasher:", *asyncio.run(scenario(PasswordHasher.check_password, hashed, args.logins)))
+    if not args.no_baseline:
+        report("bcrypt no event loop:", *asyncio.run(scenario(_blocking_check, hashed, args.logins)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""
+Compara verify_token com e sem o cache de tokens verificados
+(auth.verified_tokens), com muitos tokens sendo reapresentados como
+nas requisições de uma sessão.
+
+    python -m benchmarks.bench_token --tokens 1000 --requests 50000
+"""
+import os
+import sys
+import random
+import timeit
+import argparse
+
+# Sem .env, assina com uma chave só para o benchmark
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import auth
+from cache import TTLCache
+
+def run(tokens: list, order: list) -> None:
+    for i in order:
+        if not auth.verify_token(tokens[i]):
+            raise AssertionError("token recusado")
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="verify_token com e sem cache")
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    tokens = [auth.create_token({"sub": f"user{i}"}) for i in range(args.tokens)]
+    rng = random.Random(42)
+    order = [rng.randrange(args.tokens) for _ in range(args.requests)]
+
+    cache = auth.verified_tokens
+    try:
+        # maxsize=0 descarta cada item assim que entra: toda chamada decodifica o JWT
+        auth.verified_tokens = TTLCache(maxsize=0)
+        uncached = min(timeit.repeat(lambda: run(tokens, order), number=1, repeat=args.repeat))
+        auth.verified_tokens = cache
+        cache.clear()
+        cached = min(timeit.repeat(lambda: run(tokens, order), number=1, repeat=args.repeat))
+    finally:
+        auth.verified_tokens = cache
+
+    print(f"{args.requests} verificações de {args.tokens} tokens, melhor de {args.repeat}")
+    print(f"  sem cache: {uncached * 1000:9.1f} ms  ({uncached / args.requests * 1e6:.2f} µs/token)")
+    print(f"  com cache: {cached * 1000:9.1f} ms  ({cached / args.requests * 1e6:.2f} µs/token)")
+    print(f"  ganho: {uncached / cached:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,154 +1,782 @@
 import os
+import math
+import time
+import base64
+import asyncio
 import bcrypt
 import hashlib
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gridfs
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from bson import ObjectId
-from auth import verify_cpf
+from pymongo import AsyncMongoClient, ReplaceOne, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import ObjectId, json_util
+from datetime import datetime, timedelta, timezone
+from auth import verify_cpf, verify_cpf_batch
+from cache import TTLCache
 
 load_dotenv()
 
+def pool_options() -> dict:
+    """
+    Opções do pool de conexões lidas do ambiente.
+    """
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+    }
+    # Ex.: "zstd,snappy,zlib" — o servidor escolhe o primeiro suportado
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Coleta estatísticas do pool de conexões por servidor.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _server(self, address) -> dict:
+        key = "%s:%s" % address
+        if key not in self._stats:
+            self._stats[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "wait_queue": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "wait_time_total_ms": 0.0,
+                "wait_time_max_ms": 0.0,
+            }
+        return self._stats[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                stats = dict(stats)
+                stats["wait_time_avg_ms"] = (
+                    stats["wait_time_total_ms"] / stats["checkouts"] if stats["checkouts"] else 0.0
+                )
+                result[key] = stats
+            return result
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._server(event.address)["wait_queue"] += 1
+
+    def connection_checked_out(self, event):
+        waited_ms = event.duration * 1000
+        with self._lock:
+            stats = self._server(event.address)
+            stats["wait_queue"] -= 1
+            stats["checked_out"] += 1
+            stats["checkouts"] += 1
+            stats["wait_time_total_ms"] += waited_ms
+            stats["wait_time_max_ms"] = max(stats["wait_time_max_ms"], waited_ms)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats["wait_queue"] -= 1
+            stats["checkout_failures"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._server(event.address)["checked_out"] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event.address)["open"] -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
 class MongoDBConnection:
     """
-    Singleton para conexão com o MongoDB e GridFS.
+    Singleton para conexão assíncrona com o MongoDB e GridFS.
+
+    O pool é configurado por variáveis de ambiente (ver ``pool_options``)
+    e compartilhado por todas as classes de gerenciamento. ``connect`` e
+    ``close`` são chamados pelo lifespan da aplicação em ``main.py``.
     """
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             uri = os.getenv("MONGO_URI")
-            client = MongoClient(uri, tlsAllowInvalidCertificates=True)
+            pool_stats = PoolStatsListener()
+            # O cliente assíncrono só abre conexões na primeira operação
+            client = AsyncMongoClient(
+                uri,
+                tlsAllowInvalidCertificates=True,
+                event_listeners=[pool_stats],
+                **pool_options()
+            )
             db = client[os.getenv("MONGO_DB_NAME", "connecta")]
-            fs = gridfs.GridFS(db)
-
-            # Testa conexão
-            client.admin.command("ping")
-            print("✅ MongoDB Atlas conectado.")
+            fs = gridfs.AsyncGridFS(db)
 
             cls._instance = super().__new__(cls)
             cls._instance.client = client
             cls._instance.db = db
             cls._instance.fs = fs
+            cls._instance.pool_stats = pool_stats
         return cls._instance
 
+    async def connect(self) -> None:
+        # Abre o pool (respeitando minPoolSize) e testa conexão
+        started = time.perf_counter()
+        await self.client.aconnect()
+        await self.client.admin.command("ping")
+        print(f"✅ MongoDB Atlas conectado em {(time.perf_counter() - started) * 1000:.0f}ms.")
+
+    async def close(self) -> None:
+        await self.client.close()
+        print("MongoDB desconectado.")
+
+    def stats(self) -> dict:
+        return {"options": pool_options(), "servers": self.pool_stats.snapshot()}
+
 class PasswordHasher:
     """
     Encarregado de gerar e verificar hashes de senha.
+
+    O bcrypt roda num pool de threads limitado (BCRYPT_WORKERS) para não
+    bloquear o event loop; o custo é configurado por BCRYPT_ROUNDS.
     """
-    @staticmethod
-    def hash_password(password: str) -> bytes:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    _executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("BCRYPT_WORKERS", "4")),
+        thread_name_prefix="bcrypt"
+    )
+
+    @classmethod
+    def hash_password_sync(cls, password: str) -> bytes:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cls.rounds))
 
     @staticmethod
-    def check_password(password: str, hashed: bytes) -> bool:
+    def check_password_sync(password: str, hashed: bytes) -> bool:
         return bcrypt.checkpw(password.encode('utf-8'), hashed)
 
+    @classmethod
+    async def hash_password(cls, password: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, cls.hash_password_sync, password)
+
+    @classmethod
+    async def check_password(cls, password: str, hashed: bytes) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, cls.check_password_sync, password, hashed)
+
+    @classmethod
+    def needs_rehash(cls, hashed: bytes) -> bool:
+        # Formato: $2b$<custo>$<salt+hash>
+        try:
+            return int(hashed.split(b"$")[2]) != cls.rounds
+        except (IndexError, ValueError):
+            return True
+
+# Mensagens para violações dos índices únicos de ``indexes.py``
+DUPLICATE_USER_MESSAGES = {
+    "user.username": "Usuário já existe",
+    "user.email": "Email já está sendo usado",
+    "user.cpf": "CPF já está sendo usado",
+}
+
+def duplicate_user_message(error: dict) -> str:
+    """
+    Traduz os detalhes de um erro de chave duplicada (código 11000) na
+    mensagem de cadastro correspondente.
+    """
+    key_pattern = error.get("keyPattern") or {}
+    for field, message in DUPLICATE_USER_MESSAGES.items():
+        if field in key_pattern:
+            return message
+    # Servidores antigos só informam o nome do índice na mensagem
+    errmsg = error.get("errmsg", "")
+    for field, message in DUPLICATE_USER_MESSAGES.items():
+        if field.replace(".", "_") in errmsg:
+            return message
+    return "Usuário já existe"
+
+# Status que contam como "em aberto" nos resumos por cliente
+SERVICE_IN_PROGRESS = "EM ANDAMENTO"
+TICKET_OPEN = "pendente"
+CONTRACT_ACTIVE = "ativo"
+
+SUMMARY_FIELDS = ("contratos_ativos", "valor_contratos", "tickets_abertos", "servicos_em_andamento", "servicos_atribuidos")
+
+def _same_total(stored, expected) -> bool:
+    # valor_contratos é soma de floats: $inc e $sum acumulam em ordens diferentes
+    return math.isclose(stored, expected, rel_tol=1e-9, abs_tol=1e-6)
+
+class ClientSummaryManager:
+    """
+    Resumos materializados por cliente (coleção ``client_summaries``),
+    mantidos com $inc a cada escrita das classes de gerenciamento.
+
+    As atualizações não são transacionais com a escrita principal; o
+    ``rebuild`` recalcula tudo e informa a divergência encontrada.
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        self.db = db_conn.db
+        self.collection = db_conn.db['client_summaries']
+
+    async def apply(self, client_id, **deltas) -> None:
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not client_id or not deltas:
+            return
+        try:
+            await self.collection.update_one(
+                {"_id": str(client_id)},
+                {"$inc": deltas, "$set": {"atualizado_em": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except Exception as e:
+            # O resumo nunca deve derrubar a escrita principal
+            print("❌ Erro ao atualizar resumo do cliente:", e)
+
+    async def get_summary(self, client_id) -> dict:
+        summary = await self.collection.find_one({"_id": str(client_id)})
+        return summary or {"_id": str(client_id), **{field: 0 for field in SUMMARY_FIELDS}}
+
+    async def compute(self) -> dict:
+        """
+        Recalcula os resumos a partir das coleções de origem.
+        """
+        summaries = {}
+
+        def add(client_id, field, value):
+            if client_id is None:
+                return
+            summary = summaries.setdefault(str(client_id), {field: 0 for field in SUMMARY_FIELDS})
+            summary[field] += value
+
+        cursor = await self.db['contracts'].aggregate([
+            {"$match": {"status": CONTRACT_ACTIVE}},
+            {"$group": {"_id": "$user_id", "total": {"$sum": 1}, "valor": {"$sum": "$valor"}}},
+        ])
+        async for doc in cursor:
+            add(doc["_id"], "contratos_ativos", doc["total"])
+            add(doc["_id"], "valor_contratos", doc["valor"])
+
+        cursor = await self.db['service_assignments'].aggregate([
+            {"$group": {"_id": "$user_id", "total": {"$sum": 1}}},
+        ])
+        async for doc in cursor:
+            add(doc["_id"], "servicos_atribuidos", doc["total"])
+
+        cursor = await self.db['services'].aggregate([
+            {"$match": {"servico.status": SERVICE_IN_PROGRESS}},
+            {"$group": {"_id": "$cliente_info.id", "total": {"$sum": 1}}},
+        ])
+        async for doc in cursor:
+            add(doc["_id"], "servicos_em_andamento", doc["total"])
+
+        cursor = await self.db['tickets'].aggregate([
+            {"$match": {"ticket.status": TICKET_OPEN}},
+            {"$group": {"_id": "$user_info.id", "total": {"$sum": 1}}},
+        ])
+        async for doc in cursor:
+            add(doc["_id"], "tickets_abertos", doc["total"])
+        return summaries
+
+    async def rebuild(self, check_only: bool = False) -> dict:
+        """
+        Compara os resumos gravados com os recalculados e, fora do modo
+        ``check_only``, substitui a coleção pelos valores corretos.
+        """
+        expected = await self.compute()
+        drift = []
+        stored_ids = set()
+        async for stored in self.collection.find({}):
+            stored_ids.add(stored["_id"])
+            correct = expected.get(stored["_id"], {field: 0 for field in SUMMARY_FIELDS})
+            diff = {
+                field: {"gravado": stored.get(field, 0), "esperado": correct[field]}
+                for field in SUMMARY_FIELDS if not _same_total(stored.get(field, 0), correct[field])
+            }
+            if diff:
+                drift.append({"client_id": stored["_id"], "campos": diff})
+        for client_id in expected.keys() - stored_ids:
+            drift.append({"client_id": client_id, "campos": "ausente"})
+
+        if not check_only:
+            now = datetime.now(timezone.utc)
+            requests = [
+                ReplaceOne({"_id": client_id}, {**summary, "atualizado_em": now}, upsert=True)
+                for client_id, summary in expected.items()
+            ]
+            if requests:
+                await self.collection.bulk_write(requests, ordered=False)
+            await self.collection.delete_many({"_id": {"$nin": list(expected.keys())}})
+        return {"clientes": len(expected), "divergencias": drift}
+
+# Perfis de usuário usados para identificar o usuário logado em cada página
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
+
+PROFILE_PROJECTION = {"user.username": 1, "user.nome": 1, "user.tipo": 1, "user.cargo": 1}
+
+# Métricas do dashboard; limpo a cada escrita em serviços, tickets e contratos
+metrics_cache = TTLCache(maxsize=256, ttl=float(os.getenv("METRICS_CACHE_TTL", "30")))
+
+def service_assignment(user_id: str, service_id) -> dict:
+    return {
+        "user_id": ObjectId(user_id),
+        "service_id": service_id,
+        "status": SERVICE_IN_PROGRESS,
+        "criado_em": datetime.now(timezone.utc)
+    }
+
 class UserService:
     """
     Serviços relacionados ao usuário: cadastro e validação.
     """
     def __init__(self, db_conn: MongoDBConnection):
         self.collection = db_conn.db['users']
+        self.assignments = db_conn.db['service_assignments']
+        self.summaries = ClientSummaryManager(db_conn)
 
-    def add_user(self, user: dict) -> dict:
-
+    async def add_user(self, user: dict) -> dict:
+        # A unicidade de username/email/CPF é garantida pelos índices únicos,
+        # então o cadastro é um único insert sem consultas prévias.
         user_info = user["user"]
-        # Checa existência
-        if self.collection.find_one({"user.username": user_info["username"]}):
-            return {"status_code": 400, "message": "Usuário já existe"}
-        if self.collection.find_one({"user.email": user_info["email"]}):
-            return {"status_code": 400, "message": "Email já está sendo usado"}
         if not verify_cpf(user_info["cpf"]):
             return {"status_code": 400, "message": "CPF inválido"}
-        if self.collection.find_one({"user.cpf": user_info["cpf"]}):
-            return {"status_code": 400, "message": "CPF já está sendo usado"}
 
         # Hash da senha
-        user_info["senha"] = PasswordHasher.hash_password(user_info["senha"])
+        user_info["senha"] = await PasswordHasher.hash_password(user_info["senha"])
         try:
-            result = self.collection.insert_one(user)
+            result = await self.collection.insert_one(user)
             return {"status_code": 200, "message": "Usuário adicionado com sucesso", "id": str(result.inserted_id)}
+        except DuplicateKeyError as e:
+            return {"status_code": 400, "message": duplicate_user_message(e.details or {})}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao adicionar usuário", "erro": str(e)}
 
-    def find_user(self, identifier: str) -> dict:
+    @staticmethod
+    async def hash_passwords(users: list) -> None:
+        """Troca ``user.senha`` pelo hash nos próprios documentos, em paralelo no pool do bcrypt."""
+        infos = [
+            user["user"] for user in users
+            if isinstance(user.get("user"), dict) and isinstance(user["user"].get("senha"), str) and user["user"]["senha"]
+        ]
+        hashes = await asyncio.gather(*(PasswordHasher.hash_password(info["senha"]) for info in infos))
+        for info, hashed in zip(infos, hashes):
+            info["senha"] = hashed
+
+    async def add_users(self, users: list, hashed: bool = False) -> dict:
+        """
+        Cadastro em lote (ex.: todos os usuários de uma empresa cliente).
+        Retorna o resultado de cada linha na mesma ordem da entrada.
+        Com ``hashed``, as senhas já vêm com hash (ver hash_passwords).
+        """
+        results = [None] * len(users)
+        complete_rows = []
+        for row, user in enumerate(users):
+            user_info = user.get("user") or {}
+            missing = [f for f in ("username", "email", "cpf", "senha") if not user_info.get(f)]
+            if missing:
+                results[row] = {"row": row, "status_code": 400, "message": f"Campos obrigatórios ausentes: {', '.join(missing)}"}
+                continue
+            complete_rows.append(row)
+
+        # Todos os CPFs do lote são validados de uma vez
+        cpf_ok, _ = verify_cpf_batch(users[row]["user"]["cpf"] for row in complete_rows)
+        valid_rows = []
+        for row, ok in zip(complete_rows, cpf_ok):
+            if ok:
+                valid_rows.append(row)
+            else:
+                results[row] = {"row": row, "status_code": 400, "message": "CPF inválido"}
+
+        if not hashed:
+            await self.hash_passwords([users[row] for row in valid_rows])
+
+        write_errors = {}
+        if valid_rows:
+            try:
+                await self.collection.insert_many([users[row] for row in valid_rows], ordered=False)
+            except BulkWriteError as e:
+                # "index" é a posição dentro do lote enviado, não da entrada
+                for error in e.details.get("writeErrors", []):
+                    write_errors[valid_rows[error["index"]]] = error
+            except Exception as e:
+                return {"status_code": 500, "message": "Erro ao adicionar usuários", "erro": str(e)}
+
+        for row in valid_rows:
+            error = write_errors.get(row)
+            if error is None:
+                # insert_many atribui o _id nos próprios documentos
+                results[row] = {"row": row, "status_code": 200, "message": "Usuário adicionado com sucesso", "id": str(users[row]["_id"])}
+            elif error.get("code") == 11000:
+                results[row] = {"row": row, "status_code": 400, "message": duplicate_user_message(error)}
+            else:
+                results[row] = {"row": row, "status_code": 500, "message": "Erro ao adicionar usuário", "erro": error.get("errmsg")}
+
+        inserted = sum(1 for r in results if r["status_code"] == 200)
+        return {
+            "status_code": 200,
+            "message": f"{inserted} de {len(users)} usuários adicionados",
+            "inserted": inserted,
+            "failed": len(users) - inserted,
+            "results": results,
+        }
+
+    async def find_user(self, identifier: str) -> dict:
         # Busca por ObjectId ou username
         if ObjectId.is_valid(identifier):
             query = {"_id": ObjectId(identifier)}
         else:
             query = {"user.username": identifier}
-        return self.collection.find_one(query)
-    
-    def delete_user(self, identifier: str) -> dict:
+        return await self.collection.find_one(query)
+
+    async def get_profile(self, user_id: str) -> dict:
+        """
+        Perfil resumido do usuário (sem tickets, contratos e serviços),
+        servido do cache quando possível.
+        """
+        profile = user_cache.get(user_id)
+        if profile is not None:
+            return profile
+        if not ObjectId.is_valid(user_id):
+            return None
+        doc = await self.collection.find_one({"_id": ObjectId(user_id)}, PROFILE_PROJECTION)
+        if not doc:
+            return None
+        user_info = doc.get("user", {})
+        profile = {
+            "id": str(doc["_id"]),
+            "username": user_info.get("username"),
+            "name": user_info.get("nome"),
+            "type": user_info.get("tipo"),
+            "role": user_info.get("cargo"),
+        }
+        user_cache.set(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id) -> None:
+        user_cache.pop(str(user_id))
+
+    async def update_password(self, user_id, hashed: bytes) -> dict:
+        try:
+            result = await self.collection.update_one(
+                {"_id": ObjectId(user_id)},
+                {"$set": {"user.senha": hashed}}
+            )
+            self.invalidate(user_id)
+            return {"status_code": 200, "message": "Senha atualizada com sucesso", "data": result}
+        except Exception as e:
+            return {"status_code": 500, "message": "Erro ao atualizar senha", "erro": str(e)}
+
+    async def delete_user(self, identifier: str) -> dict:
         # Busca por ObjectId ou username
         if ObjectId.is_valid(identifier):
             query = {"_id": ObjectId(identifier)}
-            result = self.collection.delete_one(query)
+            result = await self.collection.delete_one(query)
+            self.invalidate(identifier)
             return {"status_code": 200, "message": "Usuário excluído com sucesso", "data": result}
         else:
             query = {"username": identifier}
             return {"status_code": 400, "message": "Usuário não encontrado"}
         
-    def add_service_info(self, user_id: str, service_id) -> dict:
-        service_data = {
-            "service_id": service_id,
-            "status": "PENDENTE"
-        }
-
+    async def add_service_info(self, user_id: str, service_id, session=None, update_summary: bool = True) -> dict:
+        # As atribuições ficam na coleção service_assignments, não no usuário.
+        # Para aceitar um serviço use ServiceManager.accept_service, que
+        # também muda o status do serviço de forma atômica (e atualiza o
+        # resumo ele mesmo, com update_summary=False).
         try:
-            result = self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$push": {"services_info": service_data}}
-            )
-            if result.modified_count:
-                # muda o status do serviço para aceito
-                self.service_manager.update_service(
-                    service_id,
-                    {"servico.status": "EM ANDAMENTO"}
-                )
-                return {"status_code": 200, "message": "Serviço adicionado com sucesso"}
-            
-            return {"status_code": 500, "message": "Falha ao atualizar usuário"}
+            await self.assignments.insert_one(service_assignment(user_id, service_id), session=session)
+            if update_summary:
+                await self.summaries.apply(user_id, servicos_atribuidos=1)
+            return {"status_code": 200, "message": "Serviço adicionado com sucesso"}
+        except DuplicateKeyError:
+            return {"status_code": 409, "message": "Serviço já atribuído"}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao adicionar serviço", "erro": str(e)}
-        
+
+    async def list_service_info(self, user_id: str, cursor: str = None, limit: int = 20) -> dict:
+        return await page_by_id(self.assignments, {"user_id": ObjectId(user_id)}, cursor, limit)
+
+# Campos exibidos nos cards de services.html
+SERVICE_LIST_PROJECTION = {
+    "servico.nome": 1,
+    "servico.tipo": 1,
+    "servico.descricao": 1,
+    "servico.data_de_entrega": 1,
+    "servico.status": 1,
+    "cliente_info.nome": 1,
+    "cliente_info.email": 1,
+    "versao": 1,
+}
+
+def encode_cursor(*values) -> str:
+    # json_util preserva o tipo do _id (string ou ObjectId)
+    return base64.urlsafe_b64encode(json_util.dumps(list(values)).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(values, list):
+        raise ValueError("Cursor inválido")
+    return values
+
+async def page_by_id(collection, query: dict, cursor: str = None, limit: int = 20, projection: dict = None) -> dict:
+    """
+    Paginação por cursor em ``_id`` crescente (ObjectId segue a ordem de
+    criação), usada pelas coleções de contratos e atribuições.
+    """
+    if cursor:
+        try:
+            (last_id,) = decode_cursor(cursor)
+        except ValueError:
+            return {"status_code": 400, "message": "Cursor inválido"}
+        query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+    try:
+        items = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(None)
+    except Exception as e:
+        return {"status_code": 500, "message": "Erro ao listar registros", "erro": str(e)}
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["_id"])
+    return {"status_code": 200, "message": "Registros encontrados com sucesso", "data": items, "next_cursor": next_cursor}
+
 class ServiceManager:
     """
     Serviços de criação e consulta de serviços.
     """
     def __init__(self, db_conn: MongoDBConnection):
+        self.client = db_conn.client
         self.collection = db_conn.db['services']
+        self.users = UserService(db_conn)
+        self.summaries = ClientSummaryManager(db_conn)
 
-    def add_service(self, service: dict) -> dict:
+    async def add_service(self, service: dict) -> dict:
         try:
-            result = self.collection.insert_one(service)
+            result = await self.collection.insert_one(service)
+            metrics_cache.clear()
+            if service.get("servico", {}).get("status") == SERVICE_IN_PROGRESS:
+                await self.summaries.apply(service.get("cliente_info", {}).get("id"), servicos_em_andamento=1)
             return {"status_code": 200, "message": "Serviço adicionado com sucesso", "id": str(result.inserted_id)}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao adicionar serviço", "erro": str(e)}
 
-    def get_service(self, id: str) -> dict:
+    async def list_services(
+        self,
+        status: str = None,
+        tipo: str = None,
+        client_id: str = None,
+        date_from: str = None,
+        date_to: str = None,
+        cursor: str = None,
+        limit: int = 20
+    ) -> dict:
+        """
+        Lista paginada por cursor (keyset em ``data_de_entrega`` + ``_id``),
+        com uma única consulta por página e só os campos exibidos na
+        listagem. ``next_cursor`` é None na última página.
+        """
+        query = {}
+        if status:
+            query["servico.status"] = status
+        if tipo:
+            query["servico.tipo"] = tipo
+        if client_id:
+            query["cliente_info.id"] = client_id
+        if date_from or date_to:
+            query["servico.data_de_entrega"] = {}
+            if date_from:
+                query["servico.data_de_entrega"]["$gte"] = date_from
+            if date_to:
+                query["servico.data_de_entrega"]["$lte"] = date_to
+        if cursor:
+            try:
+                last_date, last_id = decode_cursor(cursor)
+            except ValueError:
+                return {"status_code": 400, "message": "Cursor inválido"}
+            if last_date is None:
+                # Sem data (nulo ou ausente) ordena antes de todas as datas e
+                # {"$gt": None} não casa com nenhuma: o resto são as datadas
+                after = {"servico.data_de_entrega": {"$ne": None}}
+            else:
+                after = {"servico.data_de_entrega": {"$gt": last_date}}
+            query = {"$and": [query, {"$or": [
+                after,
+                {"servico.data_de_entrega": last_date, "_id": {"$gt": last_id}},
+            ]}]}
+
+        try:
+            # Busca um item a mais só para saber se existe próxima página
+            items = await self.collection.find(query, SERVICE_LIST_PROJECTION) \
+                .sort([("servico.data_de_entrega", 1), ("_id", 1)]) \
+                .limit(limit + 1) \
+                .to_list(None)
+        except Exception as e:
+            return {"status_code": 500, "message": "Erro ao listar serviços", "erro": str(e)}
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor(last["servico"].get("data_de_entrega"), last["_id"])
+        return {"status_code": 200, "message": "Serviços encontrados com sucesso", "data": items, "next_cursor": next_cursor}
+
+    async def get_service(self, id: str) -> dict:
         try:    
-            result = self.collection.find_one({"_id": id})
+            result = await self.collection.find_one({"_id": id})
             return {"status_code": 200, "message": "Serviço encontrado com sucesso", "data": result}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao buscar serviço", "erro": str(e)}
         
-    def update_service(self, id: str, data: dict) -> dict:
+    async def update_service(self, id: str, data: dict) -> dict:
         try:
             # data pode ser {"servico.status": "aceito"} ou qualquer outro campo aninhado
-            result = self.collection.update_one(
+            # O documento anterior permite ajustar o resumo do cliente
+            # "versao" identifica o card renderizado no cache de fragmentos
+            before = await self.collection.find_one_and_update(
                 {"_id": id},
-                {"$set": data}
+                {"$set": data, "$inc": {"versao": 1}},
+                projection={"servico.status": 1, "cliente_info.id": 1}
             )
-            return {"status_code": 200, "message": "Serviço atualizado com sucesso", "data": result}
+            metrics_cache.clear()
+            if before and "servico.status" in data:
+                was_in_progress = before.get("servico", {}).get("status") == SERVICE_IN_PROGRESS
+                is_in_progress = data["servico.status"] == SERVICE_IN_PROGRESS
+                await self.summaries.apply(
+                    before.get("cliente_info", {}).get("id"),
+                    servicos_em_andamento=int(is_in_progress) - int(was_in_progress)
+                )
+            return {"status_code": 200, "message": "Serviço atualizado com sucesso", "data": before}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao atualizar serviço", "erro": str(e)}
 
     
-    def delete_service(self, id: str) -> dict:
+    async def accept_service(self, id: str, user_id: str) -> dict:
+        """
+        Aceita um serviço PENDENTE: a troca de status é condicional, então
+        entre aceites simultâneos só um vence e os demais recebem 409. A
+        atribuição ao usuário é gravada na mesma transação.
+        """
+        update = {
+            "$set": {
+                "servico.status": SERVICE_IN_PROGRESS,
+                "servico.responsavel_id": user_id,
+                "servico.aceito_em": datetime.now(timezone.utc),
+            },
+            "$inc": {"versao": 1},
+        }
+
+        # O que a tentativa atual já mudou, para desfazer sem transação
+        undo = {}
+
+        async def accept(session=None):
+            undo.clear()
+            # Devolve o documento de antes: é o que o desfazer restaura
+            service = await self.collection.find_one_and_update(
+                {"_id": id, "servico.status": "PENDENTE"},
+                update,
+                projection={"cliente_info.id": 1, "servico.responsavel_id": 1, "servico.aceito_em": 1},
+                session=session
+            )
+            if not service:
+                return None, None
+            undo["service"] = service
+            # Um serviço que voltou para PENDENTE ainda tem a atribuição antiga
+            previous = await self.users.assignments.find_one_and_delete({"service_id": id}, session=session)
+            undo["previous"] = previous
+            # Sem capturar erros: with_transaction precisa ver o
+            # TransientTransactionError para repetir a transação
+            await self.users.assignments.insert_one(service_assignment(user_id, id), session=session)
+            return service, previous
+
         try:
-            result = self.collection.delete_one({"_id": ObjectId(id)})
+            try:
+                async with self.client.start_session() as session:
+                    service, previous = await session.with_transaction(accept)
+            except OperationFailure as e:
+                # Código 20: sem replica set não há transações (Mongo local)
+                if e.code != 20:
+                    raise
+                service, previous = await self._accept_without_transaction(accept, undo, id, user_id)
+        except Exception as e:
+            return {"status_code": 500, "message": "Erro ao aceitar serviço", "erro": str(e)}
+
+        if not service:
+            if await self.collection.find_one({"_id": id}, {"_id": 1}):
+                return {"status_code": 409, "message": "Serviço já foi aceito por outro funcionário"}
+            return {"status_code": 404, "message": "Serviço não encontrado"}
+
+        metrics_cache.clear()
+        await self.summaries.apply(service.get("cliente_info", {}).get("id"), servicos_em_andamento=1)
+        await self.summaries.apply(user_id, servicos_atribuidos=1)
+        if previous:
+            await self.summaries.apply(str(previous["user_id"]), servicos_atribuidos=-1)
+        return {"status_code": 200, "message": "Serviço aceito com sucesso"}
+
+    async def _accept_without_transaction(self, accept, undo: dict, id: str, user_id: str):
+        try:
+            return await accept()
+        except Exception:
+            # Desfaz o que foi gravado: status do serviço e atribuição anterior
+            service = undo.get("service")
+            if service is not None:
+                servico = service.get("servico", {})
+                restore = {"servico.status": "PENDENTE"}
+                unset = {}
+                for field in ("responsavel_id", "aceito_em"):
+                    if field in servico:
+                        restore[f"servico.{field}"] = servico[field]
+                    else:
+                        unset[f"servico.{field}"] = ""
+                changes = {"$set": restore, "$inc": {"versao": 1}}
+                if unset:
+                    changes["$unset"] = unset
+                await self.collection.update_one(
+                    {"_id": id, "servico.status": SERVICE_IN_PROGRESS, "servico.responsavel_id": user_id},
+                    changes
+                )
+            if undo.get("previous") is not None:
+                await self.users.assignments.insert_one(undo["previous"])
+            raise
+
+    async def delete_service(self, id: str) -> dict:
+        try:
+            result = await self.collection.find_one_and_delete(
+                {"_id": ObjectId(id)},
+                projection={"servico.status": 1, "cliente_info.id": 1}
+            )
+            metrics_cache.clear()
+            if result and result.get("servico", {}).get("status") == SERVICE_IN_PROGRESS:
+                await self.summaries.apply(result.get("cliente_info", {}).get("id"), servicos_em_andamento=-1)
             return {"status_code": 200, "message": "Serviço excluído com sucesso", "data": result}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao excluir serviço", "erro": str(e)}
@@ -159,75 +787,293 @@ class TicketManager:
     """
     def __init__(self, db_conn: MongoDBConnection):
         self.collection = db_conn.db['tickets']
+        self.summaries = ClientSummaryManager(db_conn)
 
-    def add_ticket(self, ticket: dict) -> dict:
+    async def add_ticket(self, ticket: dict) -> dict:
         try:
-            result = self.collection.insert_one(ticket)
+            result = await self.collection.insert_one(ticket)
+            metrics_cache.clear()
+            if ticket.get("ticket", {}).get("status") == TICKET_OPEN:
+                await self.summaries.apply(ticket.get("user_info", {}).get("id"), tickets_abertos=1)
             return {"status_code": 200, "message": "Ticket adicionado com sucesso", "id": str(result.inserted_id)}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao adicionar ticket", "erro": str(e)}
 
-    def update_ticket(self, id: str, data: dict) -> dict:
+    async def update_ticket(self, id: str, data: dict) -> dict:
         try:
-            result = self.collection.update_one({"_id": ObjectId(id)}, {"$set": data})
-            return {"status_code": 200, "message": "Ticket atualizado com sucesso", "data": result}
+            before = await self.collection.find_one_and_update(
+                {"_id": ObjectId(id)},
+                {"$set": data},
+                projection={"ticket.status": 1, "user_info.id": 1}
+            )
+            metrics_cache.clear()
+            if before and "ticket.status" in data:
+                was_open = before.get("ticket", {}).get("status") == TICKET_OPEN
+                is_open = data["ticket.status"] == TICKET_OPEN
+                await self.summaries.apply(
+                    before.get("user_info", {}).get("id"),
+                    tickets_abertos=int(is_open) - int(was_open)
+                )
+            return {"status_code": 200, "message": "Ticket atualizado com sucesso", "data": before}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao atualizar ticket", "erro": str(e)}
         
-    def delete_ticket(self, id: str) -> dict:
+    async def delete_ticket(self, id: str) -> dict:
         try:
-            result = self.collection.delete_one({"_id": ObjectId(id)})
+            result = await self.collection.find_one_and_delete(
+                {"_id": ObjectId(id)},
+                projection={"ticket.status": 1, "user_info.id": 1}
+            )
+            metrics_cache.clear()
+            if result and result.get("ticket", {}).get("status") == TICKET_OPEN:
+                await self.summaries.apply(result.get("user_info", {}).get("id"), tickets_abertos=-1)
             return {"status_code": 200, "message": "Ticket excluído com sucesso", "data": result}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao excluir ticket", "erro": str(e)}
     
-    def get_ticket(self, id: str) -> dict:
+    async def get_ticket(self, id: str) -> dict:
         try:
-            result = self.collection.find_one({"_id": ObjectId(id)})
+            result = await self.collection.find_one({"_id": ObjectId(id)})
             return {"status_code": 200, "message": "Ticket encontrado com sucesso", "data": result}
         except Exception as e:
             return {"status_code": 500, "message": "Erro ao buscar ticket", "erro": str(e)}
 
+class FileTooLargeError(Exception):
+    """
+    O arquivo enviado ultrapassa o limite de tamanho configurado.
+    """
+
+# Limite padrão de upload (MAX_UPLOAD_SIZE_MB) e tamanho das leituras
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "1024")) * 1024 * 1024
+UPLOAD_READ_SIZE = 255 * 1024  # igual ao chunk padrão do GridFS
+
+class FileStorage:
+    """
+    Armazenamento de arquivos no GridFS endereçado por conteúdo.
+
+    O arquivo é gravado em chunks enquanto o SHA-256 é calculado. Se já
+    existir um arquivo com o mesmo hash (índice único em
+    ``metadata.sha256``), a cópia nova é descartada e o contador de
+    referências do arquivo existente é incrementado.
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        self.bucket = gridfs.AsyncGridFSBucket(db_conn.db)
+        self.files = db_conn.db['fs.files']
+
+    async def store(self, stream, filename: str, content_type: str = None, max_size: int = MAX_UPLOAD_SIZE) -> dict:
+        """
+        ``stream`` é qualquer objeto com ``async read(size)``, como o
+        ``UploadFile`` do FastAPI.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        content_type = content_type or mimetypes.guess_type(filename)[0]
+        grid_in = self.bucket.open_upload_stream(filename, metadata={"content_type": content_type})
+        try:
+            while chunk := await stream.read(UPLOAD_READ_SIZE):
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise FileTooLargeError(f"Arquivo maior que {max_size} bytes")
+                sha256.update(chunk)
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except BaseException:
+            await grid_in.abort()
+            raise
+
+        digest = sha256.hexdigest()
+        result = {"file_id": grid_in._id, "sha256": digest, "size": size, "deduplicated": False}
+        while True:
+            try:
+                await self.files.update_one(
+                    {"_id": grid_in._id},
+                    {"$set": {"metadata.sha256": digest, "metadata.refcount": 1}}
+                )
+                return result
+            except DuplicateKeyError:
+                existing = await self.files.find_one_and_update(
+                    {"metadata.sha256": digest},
+                    {"$inc": {"metadata.refcount": 1}},
+                    projection={"_id": 1}
+                )
+                # O existente pode ter sido removido entre as duas operações
+                if existing:
+                    await self.bucket.delete(grid_in._id)
+                    return {**result, "file_id": existing["_id"], "deduplicated": True}
+
+    async def release(self, file_id) -> None:
+        """
+        Remove uma referência; o arquivo é apagado quando chega a zero.
+        """
+        doc = await self.files.find_one_and_update(
+            {"_id": ObjectId(file_id)},
+            {"$inc": {"metadata.refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc and doc.get("metadata", {}).get("refcount", 0) <= 0:
+            await self.bucket.delete(doc["_id"])
+
 class ContractManager:
     """
     Serviços de criação e gerenciamento de contratos.
     """
     def __init__(self, db_conn: MongoDBConnection):
-        self.users = db_conn.db['users']
+        self.contracts = db_conn.db['contracts']
         self.fs = db_conn.fs
+        self.storage = FileStorage(db_conn)
+        self.summaries = ClientSummaryManager(db_conn)
 
-    def add_contract(self, user_identifier: str, contract_data: dict, file_bytes: bytes, filename: str) -> dict:
+    async def add_contract(self, user_identifier: str, contract_data: dict, file, filename: str) -> dict:
+        # ``file`` é lido em chunks (ex.: UploadFile), sem carregar tudo na memória
         # Localiza usuário
-        user = UserService(MongoDBConnection()).find_user(user_identifier)
+        user = await UserService(MongoDBConnection()).find_user(user_identifier)
         if not user:
             return {"status_code": 404, "message": "Usuário não encontrado"}
 
         contract_id = ObjectId()
-        hash_contract = hashlib.sha256(file_bytes).hexdigest()
-        file_id = self.fs.put(file_bytes, filename=filename, metadata={"hash_contract": hash_contract})
+        try:
+            stored = await self.storage.store(file, filename)
+        except FileTooLargeError as e:
+            return {"status_code": 413, "message": str(e)}
+        file_id = stored["file_id"]
+        hash_contract = stored["sha256"]
 
         new_contract = {
             "_id": contract_id,
+            "user_id": user["_id"],
             "nome": contract_data["nome"],
             "valor": contract_data["valor"],
             "data_de_vencimento": contract_data["data_de_vencimento"],
             "status": "ativo",
             "file_id": file_id,
-            "hash_contract": hash_contract
+            "hash_contract": hash_contract,
+            "criado_em": datetime.now(timezone.utc)
         }
         try:
-            result = self.users.update_one(
-                {"_id": user["_id"]},
-                {"$push": {"contracts_info": new_contract}}
-            )
-            if result.modified_count:
-                return {"status_code": 200, "message": "Contrato adicionado com sucesso", "contract_id": str(contract_id)}
-            return {"status_code": 500, "message": "Falha ao atualizar usuário"}
+            await self.contracts.insert_one(new_contract)
+            metrics_cache.clear()
+            await self.summaries.apply(user["_id"], contratos_ativos=1, valor_contratos=new_contract["valor"])
+            return {"status_code": 200, "message": "Contrato adicionado com sucesso", "contract_id": str(contract_id)}
         except Exception as e:
+            await self.storage.release(file_id)
             return {"status_code": 500, "message": "Erro ao adicionar contrato", "erro": str(e)}
 
+    async def list_contracts(self, user_id: str, cursor: str = None, limit: int = 20) -> dict:
+        return await page_by_id(self.contracts, {"user_id": ObjectId(user_id)}, cursor, limit)
+
     # Podem ser chamados conforme a necessidade:
-    # user_service.add_user({...})
-    # service_mgr.add_service({...})
-    # ticket_mgr.add_ticket({...})
-    # contract_mgr.add_contract(user_id, contrato, bytes_data, 'contrato.pdf')
+    # await user_service.add_user({...})
+    # await service_mgr.add_service({...})
+    # await ticket_mgr.add_ticket({...})
+    # await contract_mgr.add_contract(user_id, contrato, upload_file, 'contrato.pdf')
+
+# Metas exibidas no dashboard
+POSTAGENS_PREVISTAS = int(os.getenv("POSTAGENS_PREVISTAS", "16"))
+META_FATURAMENTO = float(os.getenv("META_FATURAMENTO", "8000"))
+
+class MetricsService:
+    """
+    Métricas do dashboard calculadas no servidor com aggregation pipelines,
+    numa única ida ao banco e com escopo pelo tipo do usuário.
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        self.db = db_conn.db
+
+    @staticmethod
+    def _scope(user: dict) -> tuple:
+        # Admin e funcionário veem a operação toda; cliente só o que é dele
+        if user["type"] == "cliente":
+            return (
+                {"cliente_info.id": user["id"]},
+                {"user_info.id": user["id"]},
+                {"user_id": ObjectId(user["id"])},
+            )
+        return {}, {}, {}
+
+    async def get_dashboard(self, user: dict) -> dict:
+        cache_key = user["id"] if user["type"] == "cliente" else user["type"]
+        cached = metrics_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        services_scope, tickets_scope, contracts_scope = self._scope(user)
+        today = datetime.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+
+        pipeline = [
+            {"$documents": [{}]},
+            {"$lookup": {
+                "from": "services",
+                "pipeline": [
+                    {"$match": services_scope},
+                    {"$facet": {
+                        "em_andamento": [
+                            {"$match": {"servico.status": "EM ANDAMENTO"}},
+                            {"$count": "total"},
+                        ],
+                        # Não há coleção de postagens: contam os agendamentos da semana
+                        "postagens": [
+                            {"$match": {
+                                "servico.tipo": "agendamento",
+                                "servico.status": {"$ne": "CANCELADO"},
+                                "servico.data_de_entrega": {"$gte": week_start.isoformat(), "$lte": week_end.isoformat()},
+                            }},
+                            {"$count": "total"},
+                        ],
+                        "proximas_entregas": [
+                            {"$match": {
+                                "servico.status": {"$nin": ["CONCLUIDO", "CANCELADO"]},
+                                "servico.data_de_entrega": {"$gte": today.isoformat()},
+                            }},
+                            {"$sort": {"servico.data_de_entrega": 1}},
+                            {"$limit": 5},
+                            {"$project": {"_id": 0, "data": "$servico.data_de_entrega", "descricao": "$servico.nome"}},
+                        ],
+                    }},
+                ],
+                "as": "services",
+            }},
+            {"$lookup": {
+                "from": "tickets",
+                "pipeline": [
+                    {"$match": {**tickets_scope, "ticket.status": "pendente"}},
+                    {"$count": "total"},
+                ],
+                "as": "tickets",
+            }},
+        ]
+        if user["type"] != "funcionario":
+            pipeline.append({"$lookup": {
+                "from": "contracts",
+                "pipeline": [
+                    {"$match": {**contracts_scope, "status": "ativo"}},
+                    {"$group": {"_id": None, "total": {"$sum": "$valor"}}},
+                ],
+                "as": "contracts",
+            }})
+
+        cursor = await self.db.aggregate(pipeline)
+        result = (await cursor.to_list(None))[0]
+
+        services = result["services"][0]
+
+        def count(items):
+            return items[0]["total"] if items else 0
+
+        faturamento = count(result.get("contracts", []))
+        postagens = count(services["postagens"])
+        metrics = {
+            "projects_count": count(services["em_andamento"]),
+            "postagens_count": postagens,
+            "postagens_previstas": POSTAGENS_PREVISTAS,
+            "postagens_percent": round(postagens / POSTAGENS_PREVISTAS * 100) if POSTAGENS_PREVISTAS else 0,
+            "faturamento": faturamento,
+            "meta_faturamento": META_FATURAMENTO,
+            "faturamento_percent": round(faturamento / META_FATURAMENTO * 100) if META_FATURAMENTO else 0,
+            "tickets_pendentes": count(result["tickets"]),
+            "proximas_entregas": services["proximas_entregas"],
+        }
+        metrics_cache.set(cache_key, metrics)
+        return metrics
+
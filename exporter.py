@@ -0,0 +1,261 @@
+import io
+import os
+import csv
+import sys
+import asyncio
+import zipfile
+import argparse
+from datetime import datetime
+from bson import ObjectId, json_util
+from gridfs.errors import NoFile
+from database import MongoDBConnection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet é opcional: sem o pyarrow só CSV e JSONL ficam disponíveis
+    pa = pq = None
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Colunas de cada exportação (CSV e Parquet precisam do esquema antes da
+# primeira linha); o JSONL leva todos os campos achatados
+COLUMNS = {
+    "services": [
+        "_id", "cliente_info.id", "cliente_info.nome", "cliente_info.email",
+        "servico.nome", "servico.tipo", "servico.descricao", "servico.status",
+        "servico.data_de_entrega", "versao",
+    ],
+    "tickets": [
+        "_id", "user_info.id", "user_info.nome", "user_info.email",
+        "ticket.titulo", "ticket.mensagem", "ticket.status", "ticket.data_criacao",
+    ],
+    "contracts": [
+        "_id", "user_id", "nome", "valor", "data_de_vencimento", "status",
+        "hash_contract", "file_id", "criado_em",
+    ],
+}
+NUMERIC = {"valor": float, "versao": int}
+
+def _scalar(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        # Listas (ex.: servico.media) viram uma célula JSON
+        return json_util.dumps(value, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False)
+    return value
+
+def flatten(document: dict, prefix: str = "", flat: dict = None) -> dict:
+    """``{"servico": {"nome": ...}}`` -> ``{"servico.nome": ...}``"""
+    flat = {} if flat is None else flat
+    for key, value in document.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flatten(value, f"{path}.", flat)
+        else:
+            flat[path] = _scalar(value)
+    return flat
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Destino em memória que só guarda o que foi escrito desde a última
+    leitura: cada lote vira um pedaço da resposta e é descartado.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+class _CSVWriter:
+    def __init__(self, sink, columns):
+        # BOM para o Excel reconhecer os acentos
+        self.text = io.TextIOWrapper(sink, encoding="utf-8-sig", newline="", write_through=True)
+        self.writer = csv.DictWriter(self.text, fieldnames=columns, extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+class _JSONLWriter:
+    def __init__(self, sink, columns):
+        self.sink = sink
+
+    def write_batch(self, rows):
+        for row in rows:
+            self.sink.write(json_util.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def close(self):
+        pass
+
+class _ParquetWriter:
+    def __init__(self, sink, columns):
+        if pq is None:
+            raise ValueError("Exportação Parquet requer o pacote pyarrow")
+        self.columns = columns
+        self.schema = pa.schema([
+            (column, pa.float64() if NUMERIC.get(column) is float else pa.int64() if NUMERIC.get(column) is int else pa.string())
+            for column in columns
+        ])
+        self.writer = pq.ParquetWriter(sink, self.schema)
+
+    def _column(self, rows, column):
+        cast = NUMERIC.get(column, str)
+        values = []
+        for row in rows:
+            value = row.get(column)
+            try:
+                values.append(None if value is None else cast(value))
+            except (TypeError, ValueError):
+                values.append(None)
+        return values
+
+    def write_batch(self, rows):
+        # Cada lote vira um row group
+        self.writer.write_table(pa.table(
+            {column: self._column(rows, column) for column in self.columns},
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"csv": _CSVWriter, "jsonl": _JSONLWriter, "parquet": _ParquetWriter}
+
+class Exporter:
+    """
+    Exporta ``services``, ``tickets`` ou ``contracts`` em CSV, JSONL ou
+    Parquet, lote a lote, a partir de um cursor no servidor.
+
+    ``stream()`` gera os bytes à medida que os lotes chegam do MongoDB;
+    só um lote (``batch_size`` documentos) fica em memória por vez.
+    """
+    def __init__(self, db_conn: MongoDBConnection, collection: str, file_format: str = "csv", batch_size: int = EXPORT_BATCH_SIZE, query: dict = None):
+        if collection not in COLUMNS:
+            raise ValueError(f"Coleção não exportável: {collection}")
+        if file_format not in FORMATS:
+            raise ValueError(f"Formato inválido: {file_format}")
+        if file_format == "parquet" and pq is None:
+            raise ValueError("Exportação Parquet requer o pacote pyarrow")
+        self.db = db_conn.db
+        self.fs = db_conn.fs
+        self.collection = collection
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.query = query or {}
+
+    @property
+    def filename(self) -> str:
+        return f"{self.collection}.{self.file_format}"
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.file_format]
+
+    async def batches(self):
+        cursor = self.db[self.collection].find(self.query, batch_size=self.batch_size).sort("_id", 1)
+        batch = []
+        async for document in cursor:
+            batch.append(flatten(document))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _write(self, sink: _ChunkSink, writer_sink):
+        writer = WRITERS[self.file_format](writer_sink, COLUMNS[self.collection])
+        async for batch in self.batches():
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+        writer.close()
+        yield sink.drain()
+
+    async def stream(self):
+        sink = _ChunkSink()
+        async for data in self._write(sink, sink):
+            yield data
+
+    async def stream_zip(self):
+        """
+        Zip gerado em fluxo com a exportação e os arquivos dos contratos
+        (``arquivos/<contrato>-<nome>``), lidos do GridFS chunk a chunk.
+        """
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, mode="w") as archive:
+            # Sem seek no destino, o zipfile grava os tamanhos depois de cada arquivo
+            info = zipfile.ZipInfo(self.filename)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            entry = archive.open(info, mode="w", force_zip64=True)
+            async for data in self._write(sink, entry):
+                if data:
+                    yield data
+            entry.close()
+
+            if self.collection == "contracts":
+                files = self.db["contracts"].find({**self.query, "file_id": {"$ne": None}}, {"file_id": 1}, batch_size=self.batch_size)
+                async for contract in files:
+                    try:
+                        grid_out = await self.fs.get(contract["file_id"])
+                    except NoFile:
+                        continue
+                    info = zipfile.ZipInfo(f"arquivos/{contract['_id']}-{os.path.basename(grid_out.filename or 'arquivo')}")
+                    # PDFs e imagens já vêm comprimidos
+                    info.compress_type = zipfile.ZIP_STORED
+                    with archive.open(info, mode="w", force_zip64=True) as target:
+                        while chunk := await grid_out.read(grid_out.chunk_size):
+                            target.write(chunk)
+                            yield sink.drain()
+        yield sink.drain()
+
+async def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="Exporta serviços, tickets ou contratos.")
+    parser.add_argument("collection", choices=sorted(COLUMNS))
+    parser.add_argument("output", help="arquivo de saída")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--zip", action="store_true", help="gera um .zip (contratos incluem os arquivos do GridFS)")
+    args = parser.parse_args(argv)
+
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    try:
+        exporter = Exporter(db_conn, args.collection, args.format, args.batch_size)
+        with open(args.output, "wb") as out:
+            async for data in (exporter.stream_zip() if args.zip else exporter.stream()):
+                out.write(data)
+        print(f"✅ Exportação gravada em {args.output}")
+        return 0
+    finally:
+        await db_conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
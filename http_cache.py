@@ -0,0 +1,197 @@
+import os
+import gzip
+import zlib
+import hashlib
+from starlette.datastructures import Headers, MutableHeaders
+from assets import accepted_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+# Tipos que se beneficiam de compressão; imagens, PDFs e zips já vêm comprimidos
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/css", "text/csv", "application/json", "application/javascript", "image/svg+xml")
+
+DEFAULTS = {"compress": True, "etag": True, "cache_control": "private, no-cache"}
+
+def http_cache(**options):
+    """
+    Ajusta o comportamento do HTTPCacheMiddleware para uma rota::
+
+        @router.get("/download/{file_id}")
+        @http_cache(compress=False, etag=False)
+        async def download_file(...): ...
+
+    Opções: ``compress``, ``etag`` e ``cache_control`` (None para não
+    definir o cabeçalho).
+    """
+    unknown = options.keys() - DEFAULTS.keys()
+    if unknown:
+        raise ValueError(f"Opções desconhecidas: {sorted(unknown)}")
+
+    def decorator(endpoint):
+        endpoint.__http_cache__ = options
+        return endpoint
+    return decorator
+
+def _compressor(encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=min(COMPRESS_LEVEL, 11))
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits=31 gera o cabeçalho gzip
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    # Comparação fraca: ignora o prefixo W/
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+class HTTPCacheMiddleware:
+    """
+    Compressão negociada (brotli/gzip) e ETags fracas para as respostas
+    HTML e JSON das rotas.
+
+    - Corpos completos ganham ``ETag: W/"<sha1>"`` e, se o navegador já tem
+      a mesma versão (``If-None-Match``), a resposta vira um 304 sem corpo.
+    - Respostas em streaming (ex.: ``/services``) não são retidas para
+      calcular a ETag; só são comprimidas, bloco a bloco.
+    - Respostas que já têm ``Content-Encoding``/``ETag`` (estáticos, GridFS)
+      ou tipos já comprimidos passam direto.
+    - Rotas com ``compress=False`` e ``etag=False`` e respostas
+      ``text/event-stream`` têm os cabeçalhos enviados assim que ficam
+      prontos, sem esperar o primeiro bloco do corpo.
+    """
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = COMPRESS_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        responder = _Responder(self, scope, send)
+        await self.app(scope, receive, responder.send)
+
+class _Responder:
+    def __init__(self, middleware: HTTPCacheMiddleware, scope, send):
+        self.middleware = middleware
+        self.scope = scope
+        self._send = send
+        self.start = None
+        self.started = False
+        self.stream = None
+
+    def options(self) -> dict:
+        # O roteador preenche scope["endpoint"] antes de a rota responder
+        endpoint = self.scope.get("endpoint")
+        return {**DEFAULTS, **getattr(endpoint, "__http_cache__", {})}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if self._passthrough():
+                # Nada a fazer no corpo: libera os cabeçalhos já, sem esperar o primeiro bloco
+                self.started = True
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body":
+            # Extensões (http.response.debug, pathsend...): repassa sem alterar
+            if self.start is not None and not self.started:
+                self.started = True
+                await self._send(self.start)
+            await self._send(message)
+            return
+        if self.stream is not None:
+            await self._send_chunk(message)
+            return
+        if self.started:
+            await self._send(message)
+            return
+
+        self.started = True
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        options = self.options()
+        status = self.start["status"]
+        headers = MutableHeaders(scope=self.start)
+        request_headers = Headers(scope=self.scope)
+
+        if (
+            options["etag"] and not more_body and status == 200
+            and self.scope["method"] == "GET" and "etag" not in headers
+        ):
+            etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+            headers["ETag"] = etag
+            if options["cache_control"] and "cache-control" not in headers:
+                headers["Cache-Control"] = options["cache_control"]
+            if _etag_matches(etag, request_headers.get("if-none-match", "")):
+                await self._send_not_modified(headers)
+                return
+
+        encoding = self._encoding(options, headers, status, body, more_body)
+        if encoding is None:
+            await self._send(self.start)
+            await self._send(message)
+            return
+
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body:
+            compressed = _compress(body, encoding)
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                body = compressed
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        headers["Content-Encoding"] = encoding
+        if "content-length" in headers:
+            del headers["content-length"]
+        self.stream = _compressor(encoding)
+        await self._send(self.start)
+        await self._send_chunk(message)
+
+    def _passthrough(self) -> bool:
+        options = self.options()
+        if not options["compress"] and not options["etag"]:
+            return True
+        # SSE: cada evento precisa chegar na hora, sem compressão nem ETag
+        content_type = Headers(raw=self.start.get("headers", [])).get("content-type", "")
+        return content_type.split(";")[0].strip() == "text/event-stream"
+
+    def _encoding(self, options, headers, status, body, more_body):
+        if not options["compress"] or status in (204, 206, 304) or "content-encoding" in headers:
+            return None
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return None
+        if not more_body and len(body) < self.middleware.minimum_size:
+            return None
+        return accepted_encoding(self.scope, ("br", "gzip") if brotli is not None else ("gzip",))
+
+    async def _send_chunk(self, message):
+        compress, flush, finish = self.stream
+        more_body = message.get("more_body", False)
+        # flush a cada bloco para o navegador começar a renderizar sem esperar o fim
+        data = compress(message.get("body", b"")) + (flush() if more_body else finish())
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_not_modified(self, headers: MutableHeaders):
+        for name in ("content-length", "content-type", "content-encoding"):
+            if name in headers:
+                del headers[name]
+        self.start["status"] = 304
+        await self._send(self.start)
+        await self._send({"type": "http.response.body", "body": b""})
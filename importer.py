@@ -0,0 +1,376 @@
+import os
+import csv
+import sys
+import asyncio
+import hashlib
+import argparse
+import itertools
+from datetime import datetime, timezone
+from bson import ObjectId, json_util
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from auth import verify_cpf_batch, CPF_REASONS
+from database import (
+    MongoDBConnection,
+    PasswordHasher,
+    ClientSummaryManager,
+    duplicate_user_message,
+    metrics_cache
+)
+
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+MAX_IN_FLIGHT = int(os.getenv("IMPORT_MAX_IN_FLIGHT", "4"))
+READ_SIZE = 1024 * 1024
+
+# Campos obrigatórios por tipo de importação (caminhos com ponto)
+REQUIRED = {
+    "users": ("user.username", "user.email", "user.cpf", "user.senha"),
+    # data_de_entrega é a chave de ordenação da paginação de ServiceManager.list_services
+    "services": ("cliente_info.id", "servico.nome", "servico.tipo", "servico.status", "servico.data_de_entrega"),
+    "contracts": ("user_id", "nome", "valor", "data_de_vencimento"),
+}
+FORMATS = ("csv", "jsonl")
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError("Formato não suportado (use .csv ou .jsonl)")
+
+def file_digest(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _unflatten(row: dict) -> dict:
+    # Colunas "servico.nome" viram {"servico": {"nome": ...}}; células vazias são ignoradas
+    document = {}
+    for path, value in row.items():
+        if path is None or value in (None, ""):
+            continue
+        parent = document
+        *parents, field = path.strip().split(".")
+        for name in parents:
+            parent = parent.setdefault(name, {})
+        parent[field] = value
+    return document
+
+def _get(document: dict, path: str):
+    for name in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(name)
+    return document
+
+def read_rows(path: str, file_format: str):
+    """
+    Lê o arquivo linha a linha, gerando ``(linha, documento, erro)``.
+    Nunca carrega o arquivo inteiro na memória.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if file_format == "csv":
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, _unflatten(row), None
+            return
+        for line, text in enumerate(f, start=1):
+            if not text.strip():
+                continue
+            try:
+                # json_util aceita JSON comum e Extended JSON ($oid, $date)
+                document = json_util.loads(text)
+            except ValueError as e:
+                yield line, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(document, dict):
+                yield line, None, "Cada linha deve ser um objeto JSON"
+                continue
+            yield line, document, None
+
+async def iter_rows(path: str, file_format: str, block_size: int = BATCH_SIZE):
+    """
+    read_rows numa thread, ``block_size`` linhas por vez: a leitura do
+    arquivo e o parse do CSV/JSON não bloqueiam o event loop.
+    """
+    rows = read_rows(path, file_format)
+    try:
+        while block := await asyncio.to_thread(lambda: list(itertools.islice(rows, block_size))):
+            for row in block:
+                yield row
+    finally:
+        rows.close()
+
+async def import_status(db_conn: MongoDBConnection, import_id: str) -> dict:
+    """Checkpoint e contadores de uma importação (None se não existir)."""
+    return await db_conn.db["imports"].find_one({"_id": import_id})
+
+class BulkImporter:
+    """
+    Importa usuários, serviços ou contratos de um arquivo CSV/JSONL.
+
+    As linhas são validadas e gravadas em lotes de ``batch_size`` com
+    ``bulk_write``; no máximo ``max_in_flight`` lotes ficam pendentes, e a
+    leitura do arquivo espera quando esse limite é atingido. A memória usada
+    depende só desses dois parâmetros, não do tamanho do arquivo.
+
+    O progresso fica na coleção ``imports``: a última linha cujos lotes
+    anteriores já foram todos gravados. Cada documento recebe um ``_id``
+    derivado da importação e da linha, então reprocessar um lote depois de
+    uma interrupção (ou do início, com ``reset``) não duplica registros.
+    Linhas recusadas vão para o arquivo de rejeitos (JSONL), com o motivo.
+    """
+    def __init__(
+        self,
+        db_conn: MongoDBConnection,
+        kind: str,
+        batch_size: int = BATCH_SIZE,
+        max_in_flight: int = MAX_IN_FLIGHT
+    ):
+        if kind not in REQUIRED:
+            raise ValueError(f"Tipo de importação inválido: {kind}")
+        self.db_conn = db_conn
+        self.kind = kind
+        self.collection = db_conn.db[kind]
+        self.imports = db_conn.db["imports"]
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+
+    async def reset(self, import_id: str) -> None:
+        """
+        Recomeça a importação do início. ``iniciado_em`` é mantido: os _id
+        das linhas saem iguais e as já gravadas contam como ja_importados
+        em vez de serem duplicadas.
+        """
+        await self.imports.update_one(
+            {"_id": import_id},
+            {"$set": {"linha": 0, "inseridos": 0, "rejeitados": 0, "ja_importados": 0, "status": "reiniciada"}}
+        )
+
+    async def run(self, path: str, file_format: str, import_id: str = None, rejects_path: str = None) -> dict:
+        if import_id is None:
+            import_id = f"{self.kind}-{(await asyncio.to_thread(file_digest, path))[:16]}"
+        rejects_path = rejects_path or f"{path}.rejects.jsonl"
+        checkpoint = await self.imports.find_one({"_id": import_id})
+        if checkpoint is None:
+            checkpoint = {
+                "_id": import_id,
+                "kind": self.kind,
+                "arquivo": os.path.basename(path),
+                "linha": 0,
+                "inseridos": 0,
+                "rejeitados": 0,
+                "ja_importados": 0,
+                "iniciado_em": datetime.now(timezone.utc),
+            }
+        elif checkpoint.get("status") == "concluido":
+            return checkpoint
+        checkpoint.update({"status": "em_andamento", "rejeitos": rejects_path, "erro": None})
+        await self.imports.replace_one({"_id": import_id}, checkpoint, upsert=True)
+
+        self._checkpoint = checkpoint
+        # Prefixo fixo dos _id gerados: timestamp do início + hash da importação
+        started = checkpoint["iniciado_em"].replace(tzinfo=timezone.utc)
+        self._id_prefix = int(started.timestamp()).to_bytes(4, "big") + hashlib.sha256(import_id.encode("utf-8")).digest()[:3]
+        self._finished = {}
+        self._next_seq = 0
+
+        try:
+            # Do início (nova ou reset) o arquivo de rejeitos recomeça; numa retomada, continua
+            mode = "w" if checkpoint["linha"] == 0 else "a"
+            with open(rejects_path, mode, encoding="utf-8") as rejects:
+                self._rejects = rejects
+                await self._pipeline(path, file_format, checkpoint["linha"])
+        except Exception as e:
+            await self.imports.update_one({"_id": import_id}, {"$set": {"status": "falhou", "erro": str(e)}})
+            raise
+
+        await self._save_checkpoint({"status": "concluido", "concluido_em": datetime.now(timezone.utc)})
+        if self.kind != "users":
+            # Serviços e contratos alteram os resumos por cliente e as métricas
+            await ClientSummaryManager(self.db_conn).rebuild()
+            metrics_cache.clear()
+        return self._checkpoint
+
+    async def _pipeline(self, path: str, file_format: str, resume_after: int) -> None:
+        slots = asyncio.Semaphore(self.max_in_flight)
+        pending, failures = set(), []
+        batch, seq = [], 0
+
+        def finished(task):
+            slots.release()
+            pending.discard(task)
+            if not task.cancelled() and task.exception():
+                failures.append(task.exception())
+
+        async def dispatch(batch, seq):
+            # Contrapressão: a leitura para até um lote em andamento terminar
+            await slots.acquire()
+            if failures:
+                slots.release()
+                raise failures[0]
+            task = asyncio.create_task(self._process(seq, batch))
+            task.add_done_callback(finished)
+            pending.add(task)
+
+        try:
+            async for line, document, error in iter_rows(path, file_format, self.batch_size):
+                if line <= resume_after:
+                    continue
+                batch.append((line, document, error))
+                if len(batch) >= self.batch_size:
+                    await dispatch(batch, seq)
+                    batch, seq = [], seq + 1
+            if batch:
+                await dispatch(batch, seq)
+            await asyncio.gather(*pending, return_exceptions=True)
+            if failures:
+                raise failures[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _process(self, seq: int, batch: list) -> None:
+        counts = {"inseridos": 0, "rejeitados": 0, "ja_importados": 0}
+        accepted = []
+        for line, document, error in batch:
+            error = error or self._missing(document)
+            if error:
+                self._reject(line, document, error, counts)
+            else:
+                accepted.append((line, document))
+
+        accepted = await self._prepare(accepted, counts)
+        if accepted:
+            requests = [InsertOne(document) for _, document in accepted]
+            try:
+                result = await self.collection.bulk_write(requests, ordered=False)
+                counts["inseridos"] += result.inserted_count
+            except BulkWriteError as e:
+                counts["inseridos"] += e.details.get("nInserted", 0)
+                errors = e.details.get("writeErrors", [])
+                # Numa retomada, um usuário já gravado pode bater primeiro no
+                # índice de username/email/CPF em vez do _id
+                duplicated = [accepted[error["index"]][1]["_id"] for error in errors if error.get("code") == 11000]
+                existing = set()
+                if duplicated:
+                    existing = {doc["_id"] async for doc in self.collection.find({"_id": {"$in": duplicated}}, {"_id": 1})}
+                for error in errors:
+                    line, document = accepted[error["index"]]
+                    if document["_id"] in existing:
+                        # Linha gravada antes de uma interrupção
+                        counts["ja_importados"] += 1
+                    elif error.get("code") == 11000 and self.kind == "users":
+                        self._reject(line, document, duplicate_user_message(error), counts)
+                    else:
+                        self._reject(line, document, error.get("errmsg", "Erro ao gravar"), counts)
+
+        self._finished[seq] = (batch[-1][0], counts)
+        await self._advance()
+
+    def _missing(self, document: dict) -> str:
+        missing = [path for path in REQUIRED[self.kind] if _get(document, path) in (None, "")]
+        if missing:
+            return f"Campos obrigatórios ausentes: {', '.join(missing)}"
+        return None
+
+    async def _prepare(self, accepted: list, counts: dict) -> list:
+        """Conversões e validações específicas de cada tipo."""
+        ready = []
+        if self.kind == "users":
+            valid, reasons = verify_cpf_batch(document["user"]["cpf"] for _, document in accepted)
+            for (line, document), ok, reason in zip(accepted, valid, reasons):
+                if ok:
+                    ready.append((line, document))
+                else:
+                    self._reject(line, document, f"CPF inválido ({CPF_REASONS[reason]})", counts)
+            # Os hashes rodam em paralelo no pool do PasswordHasher
+            hashes = await asyncio.gather(*(
+                PasswordHasher.hash_password(str(document["user"]["senha"])) for _, document in ready
+            ))
+            for (_, document), hashed in zip(ready, hashes):
+                document["user"]["senha"] = hashed
+        elif self.kind == "contracts":
+            for line, document in accepted:
+                try:
+                    document["user_id"] = ObjectId(str(document["user_id"]))
+                    document["valor"] = float(document["valor"])
+                except Exception:
+                    self._reject(line, document, "user_id ou valor inválido", counts)
+                    continue
+                document.setdefault("status", "ativo")
+                document.setdefault("criado_em", datetime.now(timezone.utc))
+                ready.append((line, document))
+        else:
+            ready = accepted
+
+        for line, document in ready:
+            _id = ObjectId(self._id_prefix + line.to_bytes(5, "big"))
+            # Serviços usam _id em texto: ServiceManager busca pelo id vindo da URL
+            document["_id"] = str(_id) if self.kind == "services" else _id
+        return ready
+
+    def _reject(self, line: int, document, reason: str, counts: dict) -> None:
+        counts["rejeitados"] += 1
+        if isinstance(document, dict) and isinstance(document.get("user"), dict) and "senha" in document["user"]:
+            # Senhas (em texto ou hash) nunca vão para o arquivo de rejeitos
+            document = {**document, "user": {**document["user"], "senha": "***"}}
+        self._rejects.write(json_util.dumps({"linha": line, "motivo": reason, "dados": document}, ensure_ascii=False) + "\n")
+
+    async def _advance(self) -> None:
+        """
+        Avança o checkpoint só sobre lotes contíguos: com vários lotes em
+        paralelo, um lote posterior pode terminar antes de um anterior.
+        """
+        totals = {"inseridos": 0, "rejeitados": 0, "ja_importados": 0}
+        last_line = None
+        while self._next_seq in self._finished:
+            last_line, counts = self._finished.pop(self._next_seq)
+            for field, value in counts.items():
+                totals[field] += value
+            self._next_seq += 1
+        if last_line is None:
+            return
+        await asyncio.to_thread(self._rejects.flush)
+        for field, value in totals.items():
+            self._checkpoint[field] += value
+        self._checkpoint["linha"] = last_line
+        await self._save_checkpoint({})
+
+    async def _save_checkpoint(self, extra: dict) -> None:
+        self._checkpoint.update(extra, atualizado_em=datetime.now(timezone.utc))
+        fields = {key: value for key, value in self._checkpoint.items() if key != "_id"}
+        await self.imports.update_one({"_id": self._checkpoint["_id"]}, {"$set": fields})
+
+async def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="Importa usuários, serviços ou contratos de CSV/JSONL.")
+    parser.add_argument("kind", choices=sorted(REQUIRED))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="padrão: pela extensão do arquivo")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--rejects", help="arquivo de rejeitos (padrão: <arquivo>.rejects.jsonl)")
+    parser.add_argument("--import-id", help="padrão: tipo + hash do conteúdo do arquivo")
+    parser.add_argument("--restart", action="store_true", help="ignora o checkpoint salvo")
+    args = parser.parse_args(argv)
+
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    try:
+        importer = BulkImporter(db_conn, args.kind, args.batch_size, args.max_in_flight)
+        import_id = args.import_id or f"{args.kind}-{file_digest(args.path)[:16]}"
+        if args.restart:
+            await importer.reset(import_id)
+        result = await importer.run(args.path, args.format or detect_format(args.path), import_id, args.rejects)
+        print(f"✅ Importação {import_id}: {result['inseridos']} inseridos, "
+              f"{result['rejeitados']} rejeitados, {result['ja_importados']} já importados")
+        if result["rejeitados"]:
+            print(f"Rejeitos em {result['rejeitos']}")
+        return 0
+    finally:
+        await db_conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,194 @@
+import asyncio
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database import MongoDBConnection
+
+# Índices necessários por coleção. Os nomes são fixos para que a criação
+# seja idempotente entre deploys.
+INDEXES = {
+    "users": [
+        IndexModel([("user.username", ASCENDING)], name="user_username_unique", unique=True),
+        IndexModel([("user.email", ASCENDING)], name="user_email_unique", unique=True),
+        IndexModel([("user.cpf", ASCENDING)], name="user_cpf_unique", unique=True),
+    ],
+    "services": [
+        # Também atende a paginação por cursor de ServiceManager.list_services
+        IndexModel(
+            [("servico.status", ASCENDING), ("servico.data_de_entrega", ASCENDING), ("_id", ASCENDING)],
+            name="servico_status_entrega_id",
+        ),
+        IndexModel([("cliente_info.id", ASCENDING)], name="cliente_info_id"),
+    ],
+    "tickets": [
+        IndexModel([("user_info.id", ASCENDING)], name="ticket_user_info_id"),
+    ],
+    # Contratos e atribuições ficam fora do documento do usuário
+    "contracts": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="contract_user_id"),
+    ],
+    "service_assignments": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="assignment_user_id"),
+        # Um serviço só pode ser aceito por um funcionário
+        IndexModel(
+            [("service_id", ASCENDING)],
+            name="assignment_service_id_unique",
+            unique=True,
+            partialFilterExpression={"service_id": {"$exists": True}},
+        ),
+    ],
+    # Sessões no servidor (SESSION_BACKEND=mongo); o TTL remove as expiradas
+    "sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="session_expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("user_id", ASCENDING)], name="session_user_id"),
+    ],
+    "session_revocations": [
+        IndexModel([("expires_at", ASCENDING)], name="revocation_expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("revoked_at", ASCENDING)], name="revocation_revoked_at"),
+    ],
+    # Fila de jobs (JOB_BACKEND=mongo); o TTL remove os concluídos
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("run_at", ASCENDING)], name="job_claim"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="job_lease"),
+        IndexModel(
+            [("name", ASCENDING), ("owner", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="job_owner_idempotency_key_unique",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+        ),
+        IndexModel([("expires_at", ASCENDING)], name="job_expires_at_ttl", expireAfterSeconds=0),
+    ],
+    # Deduplicação de arquivos por conteúdo (ver FileStorage)
+    "fs.files": [
+        IndexModel(
+            [("metadata.sha256", ASCENDING)],
+            name="fs_files_sha256_unique",
+            unique=True,
+            partialFilterExpression={"metadata.sha256": {"$exists": True}},
+        ),
+    ],
+}
+
+# Índices substituídos, removidos pelo ensure_indexes
+OBSOLETE_INDEXES = {
+    # Chave de idempotência passou a ser por owner
+    "jobs": ["job_idempotency_key_unique"],
+}
+
+# Coleções cuja integridade depende dos índices únicos (o cadastro não
+# consulta duplicados antes do insert): sem eles a aplicação não sobe
+REQUIRED_INDEXES = {"users"}
+
+class IndexCreationError(RuntimeError):
+    """Um índice obrigatório (REQUIRED_INDEXES) não pôde ser criado."""
+
+# Consultas feitas pelas classes de gerenciamento, verificadas no modo --check
+QUERIES = {
+    "users": [
+        {"user.username": ""},
+        {"user.email": ""},
+        {"user.cpf": ""},
+    ],
+    "services": [
+        {"servico.status": "PENDENTE"},
+        {"cliente_info.id": ""},
+    ],
+    "tickets": [
+        {"user_info.id": ""},
+    ],
+    "contracts": [
+        {"user_id": ""},
+    ],
+    "service_assignments": [
+        {"user_id": ""},
+        {"service_id": ""},
+    ],
+    "sessions": [
+        {"user_id": ""},
+    ],
+    "jobs": [
+        {"status": "queued"},
+        {"name": "", "owner": "", "idempotency_key": ""},
+    ],
+}
+
+def _stages(plan):
+    # Percorre o plano de execução (formato clássico e SBE) coletando os estágios
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+class IndexManager:
+    """
+    Cria os índices declarados e verifica os planos de consulta.
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        self.db = db_conn.db
+
+    async def ensure_indexes(self) -> dict:
+        """
+        Cria os índices de INDEXES. Falhas em coleções de REQUIRED_INDEXES
+        levantam IndexCreationError; nas demais só são registradas.
+        """
+        report = {}
+        for collection, names in OBSOLETE_INDEXES.items():
+            existing = await self.db[collection].index_information()
+            for name in names:
+                if name in existing:
+                    await self.db[collection].drop_index(name)
+        for collection, models in INDEXES.items():
+            try:
+                report[collection] = await self.db[collection].create_indexes(models)
+            except OperationFailure as e:
+                # Ex.: duplicados já existentes impedem o índice único
+                report[collection] = {"erro": str(e)}
+                print(f"❌ Erro ao criar índices em {collection}:", e)
+        failed = sorted(REQUIRED_INDEXES & {name for name, result in report.items() if isinstance(result, dict)})
+        if failed:
+            raise IndexCreationError(
+                f"Índices obrigatórios ausentes em {', '.join(failed)}; remova os duplicados e reinicie"
+            )
+        return report
+
+    async def check_query_plans(self) -> list:
+        """
+        Executa explain() em cada consulta e retorna as que fazem COLLSCAN.
+        """
+        failures = []
+        for collection, filters in QUERIES.items():
+            for query in filters:
+                explain = await self.db[collection].find(query).explain()
+                winning_plan = explain["queryPlanner"]["winningPlan"]
+                if "COLLSCAN" in set(_stages(winning_plan)):
+                    failures.append({"collection": collection, "query": query})
+        return failures
+
+async def main(argv: list) -> int:
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    try:
+        manager = IndexManager(db_conn)
+        try:
+            print(await manager.ensure_indexes())
+        except IndexCreationError as e:
+            print(f"❌ {e}")
+            return 1
+        if "--check" not in argv:
+            return 0
+        failures = await manager.check_query_plans()
+        for failure in failures:
+            print(f"❌ COLLSCAN em {failure['collection']}: {failure['query']}")
+        if failures:
+            return 1
+        print("✅ Todas as consultas usam índices.")
+        return 0
+    finally:
+        await db_conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,457 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from cache import TTLCache
+from database import MongoDBConnection
+
+# memory (padrão: fila no próprio processo) | mongo (durável, compartilhada entre workers)
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory").lower()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Espera antes de cada nova tentativa: JOB_BACKOFF * 2^(tentativa-1), até JOB_BACKOFF_MAX
+JOB_BACKOFF = float(os.getenv("JOB_BACKOFF", "2"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "300"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "600"))
+# mongo: um job "running" cujo lease venceu (worker caiu) volta para a fila
+JOB_LEASE = float(os.getenv("JOB_LEASE", str(JOB_TIMEOUT + 60)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Espera máxima entre tentativas de buscar jobs enquanto o backend falha (failover, rede)
+JOB_CLAIM_BACKOFF_MAX = float(os.getenv("JOB_CLAIM_BACKOFF_MAX", "30"))
+# Por quanto tempo jobs concluídos continuam consultáveis
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))
+LATENCY_SAMPLES = 1000
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class RetryJob(Exception):
+    """Levantada por um handler para tentar de novo após ``delay`` segundos."""
+    def __init__(self, message: str = "", delay: float = None):
+        super().__init__(message)
+        self.delay = delay
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _seconds(start: datetime, end: datetime) -> float:
+    # O PyMongo devolve datetimes sem fuso (UTC)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return (end - start).total_seconds()
+
+def _backoff(attempts: int) -> float:
+    delay = min(JOB_BACKOFF * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    # Jitter para as novas tentativas não chegarem todas juntas
+    return delay * random.uniform(0.5, 1.0)
+
+def public(job: dict) -> dict:
+    """Job sem o payload (pode conter senhas e caminhos internos)."""
+    return {key: value for key, value in job.items() if key not in ("payload", "lease_until", "expires_at")}
+
+class JobMetrics:
+    """
+    Contadores e latências (espera na fila e execução) por tipo de job,
+    neste processo. As últimas ``LATENCY_SAMPLES`` medidas de cada tipo
+    alimentam média, p50, p95 e máximo.
+    """
+    def __init__(self):
+        self._jobs = {}
+
+    def _name(self, name: str) -> dict:
+        if name not in self._jobs:
+            self._jobs[name] = {
+                "enqueued": 0,
+                "succeeded": 0,
+                "failed": 0,
+                "retried": 0,
+                "wait": deque(maxlen=LATENCY_SAMPLES),
+                "run": deque(maxlen=LATENCY_SAMPLES),
+            }
+        return self._jobs[name]
+
+    def count(self, name: str, counter: str) -> None:
+        self._name(name)[counter] += 1
+
+    def observe(self, name: str, wait: float, run: float) -> None:
+        stats = self._name(name)
+        stats["wait"].append(wait)
+        stats["run"].append(run)
+
+    @staticmethod
+    def _summary(samples) -> dict:
+        if not samples:
+            return {"avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, stats in self._jobs.items():
+            result[name] = {
+                key: value for key, value in stats.items() if key not in ("wait", "run")
+            }
+            result[name]["wait"] = self._summary(stats["wait"])
+            result[name]["run"] = self._summary(stats["run"])
+        return result
+
+class JobQueue(ABC):
+    """
+    Fila de jobs em segundo plano para o trabalho lento disparado pelas
+    rotas (bcrypt, gravação no GridFS, chamadas ao modelo de IA).
+
+    - Handlers são registrados por nome com ``@jobs.handler("nome")`` e
+      recebem o documento do job (``job["payload"]`` e as tentativas).
+      ``on_failure(job)`` roda quando o job termina sem sucesso (tentativas
+      esgotadas, worker interrompido), para liberar o que o payload aponta.
+    - ``enqueue`` retorna na hora; a rota responde 202 e o cliente acompanha
+      o job por ``get``. Com ``idempotency_key``, repetir o pedido (do mesmo
+      ``owner``) devolve o mesmo job em vez de criar outro.
+    - Maior ``priority`` sai primeiro. Exceções geram novas tentativas com
+      backoff exponencial até ``max_attempts``; ``RetryJob(delay=...)``
+      escolhe a espera.
+
+    As subclasses implementam só o armazenamento dos jobs.
+    """
+    backend = None
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.handlers = {}
+        self.metrics = JobMetrics()
+        self._tasks = []
+
+    def handler(self, name: str, max_attempts: int = JOB_MAX_ATTEMPTS, on_failure=None):
+        def decorator(func):
+            self.handlers[name] = (func, max_attempts, on_failure)
+            return func
+        return decorator
+
+    async def enqueue(self, name: str, payload: dict, priority: int = 0, idempotency_key: str = None, owner: str = None) -> dict:
+        if name not in self.handlers:
+            raise ValueError(f"Job desconhecido: {name}")
+        now = _now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "name": name,
+            "payload": payload,
+            "priority": priority,
+            "owner": owner,
+            "idempotency_key": idempotency_key,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": self.handlers[name][1],
+            "created_at": now,
+            "run_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        job, created = await self._insert(job)
+        if created:
+            self.metrics.count(name, "enqueued")
+            self.start()
+        return job
+
+    def start(self) -> None:
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        failures = 0
+        while True:
+            try:
+                job = await self._next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Erro transitório do backend não pode matar o worker
+                failures += 1
+                delay = min(_backoff(failures), JOB_CLAIM_BACKOFF_MAX)
+                print(f"❌ Erro ao buscar o próximo job (nova tentativa em {delay:.1f}s):", e)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Falha ao gravar o estado: com o mongo, o lease devolve o job à fila
+                print(f"❌ Erro no worker de jobs ({job['name']}):", e)
+
+    async def _run(self, job: dict) -> None:
+        func = self.handlers[job["name"]][0]
+        started = time.monotonic()
+        wait = _seconds(job["run_at"], _now())
+        delay = None
+        try:
+            async with asyncio.timeout(JOB_TIMEOUT):
+                result = await func(job)
+        except RetryJob as e:
+            error, delay = str(e) or "RetryJob", e.delay
+        except TimeoutError:
+            error = f"Tempo limite de {JOB_TIMEOUT:.0f}s excedido"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            self.metrics.observe(job["name"], wait, time.monotonic() - started)
+            self.metrics.count(job["name"], "succeeded")
+            await self._finish(job, DONE, result=result)
+            return
+
+        self.metrics.observe(job["name"], wait, time.monotonic() - started)
+        if job["attempts"] >= job["max_attempts"]:
+            await self._fail(job, error)
+        else:
+            self.metrics.count(job["name"], "retried")
+            await self._retry(job, error, _backoff(job["attempts"]) if delay is None else delay)
+
+    async def _fail(self, job: dict, error: str) -> None:
+        """Falha definitiva; ``job`` ainda traz o payload para o on_failure."""
+        self.metrics.count(job["name"], "failed")
+        on_failure = self.handlers[job["name"]][2]
+        # _finish descarta o payload do documento (na memória, do próprio dict)
+        snapshot = dict(job)
+        if await self._finish(job, FAILED, error=error) and on_failure is not None:
+            # Só quem gravou a falha limpa (outro processo pode ter retomado o job)
+            try:
+                await on_failure(snapshot)
+            except Exception as e:
+                print(f"❌ Erro no on_failure de {job['name']}:", e)
+
+    async def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "workers": len([task for task in self._tasks if not task.done()]),
+            "depth": await self._depth(),
+            "jobs": self.metrics.snapshot(),
+        }
+
+    # Armazenamento (subclasses)
+    @abstractmethod
+    async def _insert(self, job: dict) -> tuple:
+        """Grava o job; com idempotency_key repetida retorna (existente, False)."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def _next(self) -> dict:
+        """Espera o próximo job pronto e o marca como ``running`` (tentativa + 1)."""
+
+    @abstractmethod
+    async def _finish(self, job: dict, status: str, result=None, error: str = None) -> bool:
+        """Grava o estado final; False se o job já não estava com este worker."""
+
+    @abstractmethod
+    async def _retry(self, job: dict, error: str, delay: float) -> None:
+        ...
+
+    @abstractmethod
+    async def _depth(self) -> dict:
+        ...
+
+class MemoryJobQueue(JobQueue):
+    """Jobs na memória do processo; os pendentes se perdem num restart."""
+    backend = "memory"
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        super().__init__(workers)
+        self.jobs = {}
+        self.finished = TTLCache(maxsize=int(os.getenv("JOB_CACHE_SIZE", "10000")), ttl=JOB_RESULT_TTL)
+        # (nome, owner, idempotency_key) -> id; expira junto com o job concluído
+        self.keys = TTLCache(maxsize=int(os.getenv("JOB_CACHE_SIZE", "10000")), ttl=JOB_RESULT_TTL)
+        self._ready = asyncio.PriorityQueue()
+        self._seq = 0
+        self._scheduled = 0
+
+    def _push(self, job: dict) -> None:
+        self._seq += 1
+        self._ready.put_nowait((-job["priority"], self._seq, job["_id"]))
+
+    async def _insert(self, job: dict) -> tuple:
+        if job["idempotency_key"]:
+            key = (job["name"], job["owner"], job["idempotency_key"])
+            existing = await self.get(self.keys.get(key))
+            if existing is not None:
+                return existing, False
+            self.keys.set(key, job["_id"])
+        self.jobs[job["_id"]] = job
+        self._push(job)
+        return job, True
+
+    async def get(self, job_id: str) -> dict:
+        return self.jobs.get(job_id) or self.finished.get(job_id)
+
+    async def _next(self) -> dict:
+        job = None
+        while job is None:
+            # Jobs descartados no stop() podem ainda ter uma nova tentativa agendada
+            _, _, job_id = await self._ready.get()
+            job = self.jobs.get(job_id)
+        job.update(status=RUNNING, started_at=_now(), attempts=job["attempts"] + 1)
+        return job
+
+    async def _finish(self, job: dict, status: str, result=None, error: str = None) -> bool:
+        job.update(status=status, result=result, error=error, finished_at=_now())
+        job.pop("payload", None)
+        self.finished.set(job["_id"], self.jobs.pop(job["_id"]))
+        if job["idempotency_key"]:
+            # Renova a chave para durar tanto quanto o resultado
+            self.keys.set((job["name"], job["owner"], job["idempotency_key"]), job["_id"])
+        return True
+
+    async def _retry(self, job: dict, error: str, delay: float) -> None:
+        job.update(status=QUEUED, error=error, run_at=_now() + timedelta(seconds=delay))
+        self._scheduled += 1
+
+        def ready():
+            self._scheduled -= 1
+            self._push(job)
+        asyncio.get_running_loop().call_later(delay, ready)
+
+    async def stop(self) -> None:
+        await super().stop()
+        # Jobs em memória não sobrevivem ao processo: falham e liberam recursos
+        for job in list(self.jobs.values()):
+            await self._fail(job, "Fila encerrada antes da execução")
+
+    async def _depth(self) -> dict:
+        running = sum(1 for job in self.jobs.values() if job["status"] == RUNNING)
+        return {"queued": self._ready.qsize(), "scheduled": self._scheduled, "running": running}
+
+class MongoJobQueue(JobQueue):
+    """
+    Jobs na coleção ``jobs``: sobrevivem a restarts e são divididos entre
+    todos os processos. Cada worker pega um job com um
+    ``find_one_and_update`` atômico e o segura por um lease; se o processo
+    cair, o job volta para a fila quando o lease vence.
+    """
+    backend = "mongo"
+
+    def __init__(self, db_conn: MongoDBConnection, workers: int = JOB_WORKERS):
+        super().__init__(workers)
+        self.collection = db_conn.db["jobs"]
+        self._wakeup = asyncio.Event()
+        self._last_recovery = 0.0
+
+    async def _insert(self, job: dict) -> tuple:
+        if not job["idempotency_key"]:
+            # Sem chave o campo fica de fora do índice único parcial
+            del job["idempotency_key"]
+        try:
+            await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.collection.find_one(
+                {"name": job["name"], "owner": job["owner"], "idempotency_key": job["idempotency_key"]}
+            )
+            if existing is not None:
+                return existing, False
+            raise
+        self._wakeup.set()
+        return job, True
+
+    async def get(self, job_id: str) -> dict:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def _recover(self) -> None:
+        # Jobs de workers que caíram: de volta à fila (ou falha, se esgotaram as tentativas)
+        now = _now()
+        expired = {"status": RUNNING, "lease_until": {"$lte": now}}
+        exhausted = {**expired, "$expr": {"$gte": ["$attempts", "$max_attempts"]}}
+        async for job in self.collection.find(exhausted):
+            if job["name"] in self.handlers:
+                await self._fail(job, "Worker interrompido")
+        await self.collection.update_many(expired, {"$set": {"status": QUEUED, "run_at": now}})
+
+    async def _claim(self) -> dict:
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {"status": QUEUED, "run_at": {"$lte": now}},
+            {"$set": {"status": RUNNING, "started_at": now, "lease_until": now + timedelta(seconds=JOB_LEASE)},
+             "$inc": {"attempts": 1}},
+            sort=[("priority", -1), ("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _next(self) -> dict:
+        while True:
+            if time.monotonic() - self._last_recovery > JOB_POLL_INTERVAL * 30:
+                self._last_recovery = time.monotonic()
+                await self._recover()
+            job = await self._claim()
+            if job is not None:
+                return job
+            # Sem jobs prontos: espera um enqueue local ou o próximo polling
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _finish(self, job: dict, status: str, result=None, error: str = None) -> bool:
+        now = _now()
+        # attempts identifica a tentativa: se o lease venceu e outro worker
+        # pegou o job, esta escrita não casa
+        updated = await self.collection.update_one(
+            {"_id": job["_id"], "status": RUNNING, "attempts": job["attempts"]},
+            {"$set": {"status": status, "result": result, "error": error, "finished_at": now,
+                      "expires_at": now + timedelta(seconds=JOB_RESULT_TTL)},
+             "$unset": {"payload": "", "lease_until": ""}}
+        )
+        return updated.modified_count == 1
+
+    async def _retry(self, job: dict, error: str, delay: float) -> None:
+        await self.collection.update_one(
+            {"_id": job["_id"], "status": RUNNING, "attempts": job["attempts"]},
+            {"$set": {"status": QUEUED, "error": error, "run_at": _now() + timedelta(seconds=delay)},
+             "$unset": {"lease_until": ""}}
+        )
+
+    async def _depth(self) -> dict:
+        now = _now()
+        depth = {"queued": 0, "scheduled": 0, "running": 0}
+        pipeline = [
+            {"$match": {"status": {"$in": [QUEUED, RUNNING]}}},
+            {"$group": {
+                "_id": {"$cond": [
+                    {"$and": [{"$eq": ["$status", QUEUED]}, {"$gt": ["$run_at", now]}]},
+                    "scheduled",
+                    "$status"
+                ]},
+                "count": {"$sum": 1}
+            }},
+        ]
+        async for row in await self.collection.aggregate(pipeline):
+            depth[row["_id"]] = row["count"]
+        return depth
+
+def create_job_queue(db_conn: MongoDBConnection) -> JobQueue:
+    """Backend escolhido por JOB_BACKEND."""
+    if JOB_BACKEND == "memory":
+        return MemoryJobQueue()
+    if JOB_BACKEND == "mongo":
+        return MongoJobQueue(db_conn)
+    raise ValueError(f"JOB_BACKEND inválido: {JOB_BACKEND}")
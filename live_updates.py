@@ -0,0 +1,169 @@
+import os
+import json
+import asyncio
+import hashlib
+from bson import json_util
+from pymongo.errors import OperationFailure, PyMongoError
+from database import MongoDBConnection
+
+WATCHED = ("services", "tickets")
+POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "5"))
+QUEUE_SIZE = 100
+
+# Campos enviados ao navegador; o resto do documento não sai do servidor
+PUBLIC_FIELDS = {
+    "services": {"servico.nome": 1, "servico.tipo": 1, "servico.status": 1, "servico.data_de_entrega": 1, "cliente_info.id": 1, "cliente_info.nome": 1},
+    "tickets": {"ticket.titulo": 1, "ticket.status": 1, "user_info.id": 1},
+}
+
+def _public(collection: str, document: dict) -> dict:
+    if document is None:
+        return None
+    result = {"_id": str(document["_id"])}
+    for path in PUBLIC_FIELDS[collection]:
+        parent, _, field = path.partition(".")
+        value = (document.get(parent) or {}).get(field)
+        if value is not None:
+            result.setdefault(parent, {})[field] = value
+    return result
+
+def _owner(event: dict):
+    document = event.get("document") or {}
+    if event["collection"] == "services":
+        return (document.get("cliente_info") or {}).get("id")
+    return (document.get("user_info") or {}).get("id")
+
+class LiveUpdates:
+    """
+    Distribui as mudanças em ``services`` e ``tickets`` para os navegadores
+    conectados. Um único change stream (ou, sem replica set, um único laço
+    de polling) alimenta as filas de todos os inscritos.
+
+    Exclusões não trazem o documento, então não dá para saber o dono: um
+    cliente só recebe a exclusão de ids que já lhe foram enviados na mesma
+    conexão.
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        self.db = db_conn.db
+        self.mode = None
+        self._subscribers = {}
+        self._task = None
+        self._resume_token = None
+
+    def subscribe(self, user: dict) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        # inscrito -> (usuário, {(coleção, id)} já enviados a ele)
+        self._subscribers[queue] = (user, set())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    def visible(user: dict, event: dict, sent: set) -> bool:
+        # Admin e funcionário acompanham tudo; cliente só o que é dele
+        if user["type"] != "cliente":
+            return True
+        key = (event["collection"], event["id"])
+        if event["operation"] == "delete":
+            if key not in sent:
+                return False
+            sent.discard(key)
+            return True
+        if _owner(event) != user["id"]:
+            return False
+        sent.add(key)
+        return True
+
+    def publish(self, event: dict) -> None:
+        for queue, (user, sent) in list(self._subscribers.items()):
+            if not self.visible(user, event, sent):
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Inscrito lento: descarta o atraso e pede para recarregar
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"operation": "resync"})
+
+    async def _run(self) -> None:
+        try:
+            await self._watch()
+        except OperationFailure as e:
+            # Mongo local sem replica set não tem change streams
+            print("Change streams indisponíveis, usando polling:", e)
+            await self._poll()
+
+    async def _watch(self) -> None:
+        self.mode = "change_stream"
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED)}}}]
+        while self._subscribers:
+            try:
+                stream = await self.db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token)
+                async with stream:
+                    self._resume_token = stream.resume_token
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        collection = change["ns"]["coll"]
+                        self.publish({
+                            "collection": collection,
+                            "operation": change["operationType"],
+                            "id": str(change["documentKey"]["_id"]),
+                            "document": _public(collection, change.get("fullDocument")),
+                        })
+                        if not self._subscribers:
+                            return
+            except OperationFailure:
+                # Se nunca abriu, não há suporte (ex.: sem replica set)
+                if self._resume_token is None:
+                    raise
+                # Histórico perdido: recomeça a partir do momento atual
+                self._resume_token = None
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                print("Erro no change stream, retomando:", e)
+                await asyncio.sleep(1)
+
+    async def _poll(self) -> None:
+        """
+        Alternativa ao change stream: compara um hash de cada documento
+        entre leituras e publica só o que mudou.
+        """
+        self.mode = "polling"
+        snapshots = {}
+        while self._subscribers:
+            for collection in WATCHED:
+                previous = snapshots.get(collection)
+                current = {}
+                async for document in self.db[collection].find({}, PUBLIC_FIELDS[collection]):
+                    digest = hashlib.sha1(json_util.dumps(document, sort_keys=True).encode("utf-8")).hexdigest()
+                    current[document["_id"]] = digest
+                    if previous is None or previous.get(document["_id"]) == digest:
+                        continue
+                    self.publish({
+                        "collection": collection,
+                        "operation": "insert" if document["_id"] not in previous else "update",
+                        "id": str(document["_id"]),
+                        "document": _public(collection, document),
+                    })
+                for removed in (previous or {}).keys() - current.keys():
+                    self.publish({"collection": collection, "operation": "delete", "id": str(removed), "document": None})
+                snapshots[collection] = current
+            await asyncio.sleep(POLL_INTERVAL)
+
+def encode_event(event: dict) -> str:
+    """Serializa o evento no formato Server-Sent Events."""
+    name = event.get("collection", "resync")
+    return f"event: {name}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -1,12 +1,40 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from database import MongoDBConnection
+from indexes import IndexManager
+from assets import static_assets
+from http_cache import HTTPCacheMiddleware
 from app.routes import views_new as views
 from app.routes import plugins 
 
-app = FastAPI(title="FastAPI App", version="1.0.0")
 
-# Monta arquivos estáticos (CSS, imagens etc)
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Abre o pool de conexões do MongoDB na subida e fecha no desligamento
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    await IndexManager(db_conn).ensure_indexes()
+    # Gera as cópias com hash e as variantes comprimidas dos estáticos
+    static_assets.build()
+    # Workers da fila de jobs (com JOB_BACKEND=mongo, retomam os pendentes)
+    views.jobs.start()
+    yield
+    await views.jobs.stop()
+    await views.live_updates.stop()
+    await plugins.planner.stop()
+    if views.sessions is not None:
+        # Grava as renovações de sessão ainda pendentes
+        await views.sessions.stop()
+    await db_conn.close()
+
+
+app = FastAPI(title="FastAPI App", version="1.0.0", lifespan=lifespan)
+
+# Compressão e ETags das respostas; ajustes por rota com @http_cache
+app.add_middleware(HTTPCacheMiddleware)
+
+# Monta arquivos estáticos (CSS, imagens etc); as URLs com hash são imutáveis
+app.mount("/static", static_assets.files(), name="static")
 
 # Inclui rotas de páginas
 app.include_router(views.router)
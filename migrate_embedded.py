@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+from database import MongoDBConnection, ClientSummaryManager
+
+CHECKPOINT_ID = "embedded_arrays"
+
+def _replace(document: dict) -> ReplaceOne:
+    # Itens antigos podem não ter _id; o próprio conteúdo vira o filtro,
+    # o que mantém a migração idempotente se um lote for reexecutado.
+    selector = {"_id": document["_id"]} if "_id" in document else dict(document)
+    return ReplaceOne(selector, document, upsert=True)
+
+class EmbeddedArraysMigration:
+    """
+    Move ``contracts_info`` e ``services_info`` do documento do usuário
+    para as coleções ``contracts`` e ``service_assignments``, em lotes.
+
+    O último usuário migrado fica salvo na coleção ``migrations``, então
+    uma execução interrompida continua de onde parou.
+    """
+    def __init__(self, db_conn: MongoDBConnection, batch_size: int = 100, pause: float = 0.0):
+        self.users = db_conn.db['users']
+        self.contracts = db_conn.db['contracts']
+        self.assignments = db_conn.db['service_assignments']
+        self.checkpoints = db_conn.db['migrations']
+        self.conflicts = db_conn.db['migration_conflicts']
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def reset(self) -> None:
+        await self.checkpoints.delete_one({"_id": CHECKPOINT_ID})
+
+    async def run(self) -> dict:
+        checkpoint = await self.checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+        last_id = checkpoint.get("last_user_id")
+        totals = {
+            "usuarios": checkpoint.get("usuarios", 0),
+            "contratos": checkpoint.get("contratos", 0),
+            "atribuicoes": checkpoint.get("atribuicoes", 0),
+            "conflitos": checkpoint.get("conflitos", 0),
+        }
+        pending = {"$or": [{"contracts_info.0": {"$exists": True}}, {"services_info.0": {"$exists": True}}]}
+
+        while True:
+            query = pending if last_id is None else {"$and": [pending, {"_id": {"$gt": last_id}}]}
+            batch = await self.users.find(query, {"contracts_info": 1, "services_info": 1}) \
+                .sort("_id", 1) \
+                .limit(self.batch_size) \
+                .to_list(None)
+            if not batch:
+                break
+
+            contracts, assignments = [], []
+            for user in batch:
+                for contract in user.get("contracts_info") or []:
+                    contracts.append({**contract, "user_id": user["_id"]})
+                for assignment in user.get("services_info") or []:
+                    assignments.append({**assignment, "user_id": user["_id"]})
+
+            contract_conflicts = await self._write(self.contracts, contracts, "contracts")
+            assignment_conflicts = await self._write(self.assignments, assignments, "service_assignments")
+            # Só remove os arrays depois que as cópias foram gravadas
+            await self.users.update_many(
+                {"_id": {"$in": [user["_id"] for user in batch]}},
+                {"$unset": {"contracts_info": "", "services_info": ""}}
+            )
+
+            last_id = batch[-1]["_id"]
+            totals["usuarios"] += len(batch)
+            totals["contratos"] += len(contracts) - contract_conflicts
+            totals["atribuicoes"] += len(assignments) - assignment_conflicts
+            totals["conflitos"] += contract_conflicts + assignment_conflicts
+            await self.checkpoints.update_one(
+                {"_id": CHECKPOINT_ID},
+                {"$set": {"last_user_id": last_id, **totals, "atualizado_em": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+            print(f"Migrados {totals['usuarios']} usuários (último: {last_id})")
+            if self.pause:
+                await asyncio.sleep(self.pause)
+
+        return totals
+
+    async def _write(self, collection, documents: list, name: str) -> int:
+        """
+        Grava as cópias e retorna quantas violaram um índice único. O
+        add_service_info antigo gerava atribuições duplicadas para o mesmo
+        serviço; elas vão para ``migration_conflicts`` em vez de travar a
+        migração sempre no mesmo lote.
+        """
+        if not documents:
+            return 0
+        try:
+            await collection.bulk_write([_replace(document) for document in documents], ordered=False)
+            return 0
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+        await self.conflicts.insert_many([
+            {
+                "collection": name,
+                "document": documents[error["index"]],
+                "erro": error.get("errmsg"),
+                "registrado_em": datetime.now(timezone.utc),
+            }
+            for error in errors
+        ])
+        return len(errors)
+
+async def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description="Migra contratos e serviços embutidos nos usuários.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--pause", type=float, default=0.0, help="segundos entre lotes")
+    parser.add_argument("--reset", action="store_true", help="ignora o checkpoint salvo")
+    args = parser.parse_args(argv)
+
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    try:
+        migration = EmbeddedArraysMigration(db_conn, batch_size=args.batch_size, pause=args.pause)
+        if args.reset:
+            await migration.reset()
+        totals = await migration.run()
+        print(f"✅ Migração concluída: {totals}")
+        # Os resumos por cliente passam a ser calculados das novas coleções
+        await ClientSummaryManager(db_conn).rebuild()
+        return 0
+    finally:
+        await db_conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
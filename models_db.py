@@ -1,3 +1,4 @@
+import asyncio
 from bson import ObjectId
 
 from database import UserService, MongoDBConnection, ServiceManager, TicketManager, ContractManager
@@ -137,8 +138,6 @@ user_info = {
         "senha": "777-Rroot"
     },
     "tickets": [],
-    "contracts_info": [],
-    "services_info": [],
     "status": "PENDENTE",
     }
 
@@ -165,13 +164,19 @@ services = {
 
 
 
-db = MongoDBConnection()
-service = UserService(db_conn=db)
-result = service.add_user(user_info)
-print(result)
+async def main():
+    db = MongoDBConnection()
+    await db.connect()
+    service = UserService(db_conn=db)
+    result = await service.add_user(user_info)
+    print(result)
 
 
-service = ServiceManager(db_conn=db)
-result = service.add_service(services)
+    service = ServiceManager(db_conn=db)
+    result = await service.add_service(services)
 
-print(result)
\ No newline at end of file
+    print(result)
+    await db.close()
+
+
+asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import tempfile
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, nodes
+from jinja2.ext import Extension
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from cache import TTLCache
+from assets import static_assets
+
+# Bytecode compilado dos templates, compartilhado entre workers e reinícios
+BYTECODE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "connecta-jinja"))
+AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "true").lower() == "true"
+
+# Fragmentos renderizados ({% cache %}); o TTL limita quanto um fragmento
+# pode ficar desatualizado se o documento mudar fora das classes de gerenciamento
+fragment_cache = TTLCache(
+    maxsize=int(os.getenv("FRAGMENT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+)
+
+class FragmentCacheExtension(Extension):
+    """
+    ``{% cache "nome", chave1, chave2 %}...{% endcache %}`` guarda o HTML
+    do bloco, identificado pelo nome e pelos valores das chaves. As chaves
+    devem conter tudo de que o bloco depende (ex.: id e versão do serviço).
+    """
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_cache_support", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    @staticmethod
+    def _key(args) -> str:
+        raw = json.dumps(args, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _cache_support(self, args, caller):
+        if self.environment.is_async:
+            return self._cache_support_async(args, caller)
+        key = self._key(args)
+        rv = fragment_cache.get(key)
+        if rv is None:
+            rv = caller()
+            fragment_cache.set(key, rv)
+        return rv
+
+    async def _cache_support_async(self, args, caller):
+        key = self._key(args)
+        rv = fragment_cache.get(key)
+        if rv is None:
+            rv = await caller()
+            fragment_cache.set(key, rv)
+        return rv
+
+def _environment(directory: str, enable_async: bool) -> Environment:
+    # O código gerado difere entre os modos síncrono e assíncrono
+    bytecode_dir = os.path.join(BYTECODE_DIR, "async" if enable_async else "sync")
+    os.makedirs(bytecode_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(directory),
+        autoescape=True,
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+        auto_reload=AUTO_RELOAD,
+        extensions=[FragmentCacheExtension],
+        enable_async=enable_async,
+    )
+    # URLs dos arquivos estáticos com hash (ver assets.AssetPipeline)
+    env.globals.update(
+        static_url=static_assets.url,
+        theme_css=static_assets.theme_css,
+        css_bundled=static_assets.bundle_css,
+    )
+    return env
+
+class Templates(Jinja2Templates):
+    """
+    Jinja2Templates com cache de bytecode em disco, cache de fragmentos e
+    renderização em streaming para listas longas.
+    """
+    def __init__(self, directory: str = "app/templates"):
+        super().__init__(env=_environment(directory, enable_async=False))
+        self.async_env = _environment(directory, enable_async=True)
+
+    def add_filter(self, name: str, func) -> None:
+        self.env.filters[name] = func
+        self.async_env.filters[name] = func
+
+    def stream(self, name: str, context: dict, status_code: int = 200, headers: dict = None) -> StreamingResponse:
+        """
+        Envia o HTML em partes à medida que é gerado; laços ``{% for %}``
+        podem iterar diretamente sobre cursores assíncronos.
+        """
+        template = self.async_env.get_template(name)
+        return StreamingResponse(
+            template.generate_async(context),
+            status_code=status_code,
+            media_type="text/html; charset=utf-8",
+            headers=headers
+        )
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import secrets
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pymongo import UpdateOne, ReplaceOne
+from cache import TTLCache
+from database import MongoDBConnection
+
+# jwt (padrão: só o cookie assinado, sem sessão no servidor) | memory | mongo | redis
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "jwt").lower()
+SESSION_COOKIE = "session_id"
+IDLE_MINUTES = int(os.getenv("SESSION_IDLE_MINUTES", "120"))
+REMEMBER_IDLE_DAYS = int(os.getenv("SESSION_REMEMBER_IDLE_DAYS", "7"))
+MAX_AGE_DAYS = int(os.getenv("SESSION_MAX_AGE_DAYS", "30"))
+# Intervalo das escritas em lote (renovações) e da leitura das revogações
+FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "15"))
+# Por quanto tempo cada worker reaproveita uma sessão lida do backend
+CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "15"))
+MAX_AGE = MAX_AGE_DAYS * 86400
+
+def _key(session_id: str) -> str:
+    # Só o hash do id fica guardado: um vazamento do backend não expõe sessões
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+def _to_timestamp(value: datetime) -> float:
+    # O PyMongo devolve datetimes sem fuso (UTC)
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+class SessionStore(ABC):
+    """
+    Sessões no servidor: id aleatório no cookie -> perfil do usuário.
+
+    - Expiração deslizante: cada acesso empurra ``expires_at`` (120 min, ou
+      7 dias com "manter conectado"), limitada a ``MAX_AGE_DAYS`` do login.
+    - As renovações ficam em memória e são gravadas em lote a cada
+      ``FLUSH_INTERVAL``, então um acesso não custa uma ida ao backend.
+    - Revogações entram num dicionário local (consulta O(1)) e são lidas
+      do backend no mesmo laço, para valerem nos outros workers.
+
+    As subclasses implementam só o acesso ao backend.
+    """
+    def __init__(self):
+        self.cache = TTLCache(maxsize=int(os.getenv("SESSION_CACHE_SIZE", "10000")), ttl=CACHE_TTL)
+        self.revoked = {}
+        self._touches = {}
+        self._task = None
+        self._last_sync = time.time()
+
+    @staticmethod
+    def _next_expiry(session: dict, now: float) -> float:
+        idle = REMEMBER_IDLE_DAYS * 86400 if session["persistent"] else IDLE_MINUTES * 60
+        return min(now + idle, session["created_at"] + MAX_AGE)
+
+    async def create(self, profile: dict, persistent: bool = False) -> str:
+        session_id = secrets.token_urlsafe(32)
+        now = time.time()
+        session = {"user_id": profile["id"], "profile": profile, "persistent": persistent, "created_at": now}
+        session["expires_at"] = self._next_expiry(session, now)
+        key = _key(session_id)
+        await self._save(key, session)
+        self.cache.set(key, session)
+        self._start()
+        return session_id
+
+    async def get(self, session_id: str) -> dict:
+        key = _key(session_id)
+        if key in self.revoked:
+            return None
+        session = self.cache.get(key)
+        if session is None:
+            session = await self._load(key)
+            if session is None:
+                return None
+            self.cache.set(key, session)
+        now = time.time()
+        if session["expires_at"] <= now:
+            self.cache.pop(key)
+            return None
+        expires_at = self._next_expiry(session, now)
+        # Só agenda a escrita quando a expiração avançou mais que um intervalo
+        if expires_at - session["expires_at"] >= FLUSH_INTERVAL:
+            session["expires_at"] = expires_at
+            self._touches[key] = session
+            self._start()
+        return session
+
+    async def revoke(self, session_id: str) -> None:
+        await self._revoke([_key(session_id)])
+
+    async def revoke_user(self, user_id: str) -> int:
+        """Encerra todas as sessões do usuário (ex.: senha trocada)."""
+        keys = await self._keys_for_user(user_id)
+        await self._revoke(keys)
+        return len(keys)
+
+    async def _revoke(self, keys: list) -> None:
+        if not keys:
+            return
+        until = time.time() + MAX_AGE
+        for key in keys:
+            self.revoked[key] = until
+            self.cache.pop(key)
+            self._touches.pop(key, None)
+        await self._delete(keys, until)
+
+    def _start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print("Erro ao gravar sessões:", e)
+
+    async def flush(self) -> None:
+        touches, self._touches = self._touches, {}
+        if touches:
+            await self._write_touches(touches)
+        now = time.time()
+        # Margem de 1 s para revogações gravadas durante a leitura anterior
+        since, self._last_sync = self._last_sync - 1, now
+        for key, until in await self._revocations_since(since):
+            self.revoked[key] = until
+            self.cache.pop(key)
+        self.revoked = {key: until for key, until in self.revoked.items() if until > now}
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # Acesso ao backend
+    @abstractmethod
+    async def _save(self, key: str, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def _load(self, key: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def _write_touches(self, sessions: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def _delete(self, keys: list, until: float) -> None:
+        ...
+
+    @abstractmethod
+    async def _keys_for_user(self, user_id: str) -> list:
+        ...
+
+    @abstractmethod
+    async def _revocations_since(self, since: float) -> list:
+        ...
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessões num LRU do próprio processo. Serve para um único worker (ou
+    desenvolvimento): as sessões somem quando o processo reinicia.
+    """
+    def __init__(self):
+        super().__init__()
+        self.sessions = TTLCache(maxsize=int(os.getenv("SESSION_MEMORY_SIZE", "100000")), ttl=MAX_AGE)
+        self.by_user = {}
+
+    async def _save(self, key, session):
+        self.sessions.set(key, session)
+        self.by_user.setdefault(session["user_id"], set()).add(key)
+
+    async def _load(self, key):
+        return self.sessions.get(key)
+
+    async def _write_touches(self, sessions):
+        # O dicionário da sessão já foi atualizado no lugar
+        pass
+
+    async def _delete(self, keys, until):
+        for key in keys:
+            session = self.sessions.pop(key)
+            if session:
+                self.by_user.get(session["user_id"], set()).discard(key)
+
+    async def _keys_for_user(self, user_id):
+        return [key for key in self.by_user.pop(user_id, set()) if key in self.sessions]
+
+    async def _revocations_since(self, since):
+        return []
+
+class MongoSessionStore(SessionStore):
+    """
+    Sessões na coleção ``sessions``, removidas pelo índice TTL em
+    ``expires_at``; revogações em ``session_revocations`` (ver indexes.py).
+    """
+    def __init__(self, db_conn: MongoDBConnection):
+        super().__init__()
+        self.collection = db_conn.db["sessions"]
+        self.revocations = db_conn.db["session_revocations"]
+
+    async def _save(self, key, session):
+        await self.collection.insert_one({
+            **session,
+            "_id": key,
+            "created_at": _to_datetime(session["created_at"]),
+            "expires_at": _to_datetime(session["expires_at"]),
+        })
+
+    async def _load(self, key):
+        doc = await self.collection.find_one({"_id": key})
+        if doc is None:
+            return None
+        doc.pop("_id")
+        doc["created_at"] = _to_timestamp(doc["created_at"])
+        doc["expires_at"] = _to_timestamp(doc["expires_at"])
+        return doc
+
+    async def _write_touches(self, sessions):
+        # Sem upsert: uma sessão revogada no meio do lote não volta a existir
+        await self.collection.bulk_write([
+            UpdateOne({"_id": key}, {"$set": {"expires_at": _to_datetime(session["expires_at"])}})
+            for key, session in sessions.items()
+        ], ordered=False)
+
+    async def _delete(self, keys, until):
+        now = datetime.now(timezone.utc)
+        await self.collection.delete_many({"_id": {"$in": keys}})
+        await self.revocations.bulk_write([
+            ReplaceOne({"_id": key}, {"revoked_at": now, "expires_at": _to_datetime(until)}, upsert=True)
+            for key in keys
+        ], ordered=False)
+
+    async def _keys_for_user(self, user_id):
+        return [doc["_id"] async for doc in self.collection.find({"user_id": user_id}, {"_id": 1})]
+
+    async def _revocations_since(self, since):
+        cursor = self.revocations.find({"revoked_at": {"$gte": _to_datetime(since)}})
+        return [(doc["_id"], _to_timestamp(doc["expires_at"])) async for doc in cursor]
+
+class LocalRedis:
+    """
+    Substituto em memória para o subconjunto de comandos Redis usado por
+    RedisSessionStore, para desenvolvimento sem um servidor Redis.
+    """
+    def __init__(self):
+        self._values = {}
+        self._sets = {}
+        self._zsets = {}
+
+    async def get(self, name):
+        value, expires_at = self._values.get(name, (None, None))
+        if expires_at is not None and expires_at <= time.time() * 1000:
+            self._values.pop(name, None)
+            return None
+        return value
+
+    async def set(self, name, value, pxat=None, xx=False):
+        if xx and await self.get(name) is None:
+            return None
+        self._values[name] = (value, pxat)
+        return True
+
+    async def delete(self, *names):
+        return sum(self._values.pop(name, None) is not None for name in names)
+
+    async def sadd(self, name, *values):
+        self._sets.setdefault(name, set()).update(values)
+
+    async def smembers(self, name):
+        return set(self._sets.get(name, set()))
+
+    async def srem(self, name, *values):
+        self._sets.get(name, set()).difference_update(values)
+
+    async def zadd(self, name, mapping):
+        self._zsets.setdefault(name, {}).update(mapping)
+
+    async def zrangebyscore(self, name, low, high, withscores=False):
+        low = float("-inf") if low == "-inf" else float(low)
+        high = float("inf") if high == "+inf" else float(high)
+        items = sorted((score, member) for member, score in self._zsets.get(name, {}).items() if low <= score <= high)
+        return [(member, score) for score, member in items] if withscores else [member for _, member in items]
+
+    async def zremrangebyscore(self, name, low, high):
+        for member in await self.zrangebyscore(name, low, high):
+            del self._zsets[name][member]
+
+    def pipeline(self, transaction: bool = True):
+        return _LocalPipeline(self)
+
+    async def aclose(self):
+        pass
+
+class _LocalPipeline:
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((getattr(self._client, name), args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        commands, self._commands = self._commands, []
+        return [await command(*args, **kwargs) for command, args, kwargs in commands]
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessões em Redis (ou compatível) com expiração nativa por chave. Sem
+    ``REDIS_URL`` ou sem o pacote ``redis``, usa o LocalRedis.
+    """
+    PREFIX = "session:"
+    USER_PREFIX = "session-user:"
+    REVOCATIONS = "session-revocations"
+
+    def __init__(self, client=None):
+        super().__init__()
+        self.client = client or self._connect()
+
+    @staticmethod
+    def _connect():
+        url = os.getenv("REDIS_URL")
+        if url:
+            try:
+                import redis.asyncio as redis
+                return redis.from_url(url)
+            except ImportError:
+                print("Pacote redis não instalado, usando LocalRedis")
+        return LocalRedis()
+
+    async def _save(self, key, session):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.PREFIX + key, json.dumps(session), pxat=int(session["expires_at"] * 1000))
+            pipe.sadd(self.USER_PREFIX + session["user_id"], key)
+            await pipe.execute()
+
+    async def _load(self, key):
+        value = await self.client.get(self.PREFIX + key)
+        return json.loads(value) if value else None
+
+    async def _write_touches(self, sessions):
+        # Um único round-trip para o lote; xx=True não recria sessões revogadas
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, session in sessions.items():
+                pipe.set(self.PREFIX + key, json.dumps(session), pxat=int(session["expires_at"] * 1000), xx=True)
+            await pipe.execute()
+
+    async def _delete(self, keys, until):
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(*[self.PREFIX + key for key in keys])
+            pipe.zadd(self.REVOCATIONS, {key: now for key in keys})
+            pipe.zremrangebyscore(self.REVOCATIONS, "-inf", now - MAX_AGE)
+            await pipe.execute()
+
+    async def _keys_for_user(self, user_id):
+        keys = [_text(key) for key in await self.client.smembers(self.USER_PREFIX + user_id)]
+        if keys:
+            await self.client.srem(self.USER_PREFIX + user_id, *keys)
+        return keys
+
+    async def _revocations_since(self, since):
+        members = await self.client.zrangebyscore(self.REVOCATIONS, since, "+inf", withscores=True)
+        return [(_text(key), score + MAX_AGE) for key, score in members]
+
+def create_session_store(db_conn: MongoDBConnection) -> SessionStore:
+    """Backend escolhido por SESSION_BACKEND; None mantém só o JWT."""
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    if SESSION_BACKEND == "mongo":
+        return MongoSessionStore(db_conn)
+    if SESSION_BACKEND == "redis":
+        return RedisSessionStore()
+    if SESSION_BACKEND != "jwt":
+        raise ValueError(f"SESSION_BACKEND inválido: {SESSION_BACKEND}")
+    return None
@@ -0,0 +1,27 @@
+import asyncio
+import sys
+from database import MongoDBConnection, ClientSummaryManager
+
+async def main(argv: list) -> int:
+    """
+    Recalcula a coleção client_summaries. Com --check apenas informa a
+    divergência, sem gravar, e sai com código 1 se houver alguma.
+    """
+    db_conn = MongoDBConnection()
+    await db_conn.connect()
+    try:
+        check_only = "--check" in argv
+        report = await ClientSummaryManager(db_conn).rebuild(check_only=check_only)
+        for drift in report["divergencias"]:
+            print(f"❌ Divergência no cliente {drift['client_id']}: {drift['campos']}")
+        print(f"{report['clientes']} clientes, {len(report['divergencias'])} divergências.")
+        if check_only and report["divergencias"]:
+            return 1
+        if not check_only:
+            print("✅ Resumos reconstruídos.")
+        return 0
+    finally:
+        await db_conn.close()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,208 @@
+"""
+Testes de ServiceManager.accept_service contra coleções falsas em
+memória: aceites simultâneos, repetição de transação e o desfazer do
+caminho sem transação.
+"""
+import copy
+import asyncio
+from types import SimpleNamespace
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from database import ServiceManager, SERVICE_IN_PROGRESS
+
+def run(coro):
+    return asyncio.run(coro)
+
+def _get(doc: dict, path: str):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+def _set(doc: dict, path: str, value) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+def _unset(doc: dict, path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part, {})
+    doc.pop(last, None)
+
+class FakeCollection:
+    """O mínimo do AsyncCollection usado por accept_service; cede o loop a cada operação."""
+    def __init__(self, unique: str = None):
+        self.docs = []
+        self.unique = unique
+        self.fail_insert = []  # exceções levantadas pelos próximos insert_one
+
+    def _match(self, doc: dict, query: dict) -> bool:
+        return all(_get(doc, field) == value for field, value in query.items())
+
+    async def find_one(self, query, projection=None, session=None):
+        await asyncio.sleep(0)
+        return next((copy.deepcopy(doc) for doc in self.docs if self._match(doc, query)), None)
+
+    async def find_one_and_update(self, query, update, projection=None, session=None):
+        await asyncio.sleep(0)
+        for doc in self.docs:
+            if self._match(doc, query):
+                before = copy.deepcopy(doc)
+                self._apply(doc, update)
+                return before
+        return None
+
+    async def update_one(self, query, update, upsert=False, session=None):
+        await asyncio.sleep(0)
+        doc = next((doc for doc in self.docs if self._match(doc, query)), None)
+        if doc is None and upsert:
+            doc = {**query}
+            self.docs.append(doc)
+        if doc is not None:
+            self._apply(doc, update)
+        return SimpleNamespace(modified_count=int(doc is not None))
+
+    async def find_one_and_delete(self, query, projection=None, session=None):
+        await asyncio.sleep(0)
+        for doc in self.docs:
+            if self._match(doc, query):
+                self.docs.remove(doc)
+                return doc
+        return None
+
+    async def insert_one(self, doc, session=None):
+        await asyncio.sleep(0)
+        if self.fail_insert:
+            raise self.fail_insert.pop(0)
+        if self.unique and any(_get(d, self.unique) == _get(doc, self.unique) for d in self.docs):
+            raise DuplicateKeyError("duplicate key")
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(doc)
+
+    @staticmethod
+    def _apply(doc: dict, update: dict) -> None:
+        for path, value in update.get("$set", {}).items():
+            _set(doc, path, value)
+        for path in update.get("$unset", {}):
+            _unset(doc, path)
+        for path, value in update.get("$inc", {}).items():
+            _set(doc, path, (_get(doc, path) or 0) + value)
+
+class FakeSession:
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def with_transaction(self, callback):
+        # Como o PyMongo: desfaz e repete enquanto o erro for transitório
+        if not self.client.transactions:
+            raise OperationFailure("Transaction numbers are only allowed on a replica set member", code=20)
+        while True:
+            snapshot = {name: copy.deepcopy(c.docs) for name, c in self.client.db.items()}
+            try:
+                return await callback(self)
+            except PyMongoError as e:
+                for name, docs in snapshot.items():
+                    self.client.db[name].docs = docs
+                if not e.has_error_label("TransientTransactionError"):
+                    raise
+                self.client.retries += 1
+
+class FakeClient:
+    def __init__(self, db: dict, transactions: bool):
+        self.db = db
+        self.transactions = transactions
+        self.retries = 0
+
+    def start_session(self):
+        return FakeSession(self)
+
+def manager(transactions: bool = True) -> ServiceManager:
+    db = {
+        "services": FakeCollection(),
+        "service_assignments": FakeCollection(unique="service_id"),
+        "client_summaries": FakeCollection(),
+        "users": FakeCollection(),
+    }
+    db["services"].docs.append({"_id": "s1", "servico": {"status": "PENDENTE"}, "cliente_info": {"id": "c1"}, "versao": 1})
+    return ServiceManager(SimpleNamespace(client=FakeClient(db, transactions), db=db))
+
+def summary(svc: ServiceManager, client_id: str) -> dict:
+    return next((d for d in svc.summaries.collection.docs if d["_id"] == client_id), {})
+
+def transient_error() -> PyMongoError:
+    error = OperationFailure("WriteConflict", code=112)
+    error._add_error_label("TransientTransactionError")
+    return error
+
+def test_hundred_concurrent_accepts_have_one_winner():
+    svc = manager()
+    users = [str(ObjectId()) for _ in range(100)]
+
+    async def scenario():
+        return await asyncio.gather(*(svc.accept_service("s1", user) for user in users))
+
+    results = run(scenario())
+    codes = [result["status_code"] for result in results]
+    assert codes.count(200) == 1 and codes.count(409) == 99
+    winner = users[codes.index(200)]
+
+    assignments = svc.users.assignments.docs
+    assert len(assignments) == 1 and str(assignments[0]["user_id"]) == winner
+    service = svc.collection.docs[0]
+    assert service["servico"]["status"] == SERVICE_IN_PROGRESS
+    assert service["servico"]["responsavel_id"] == winner
+    assert service["versao"] == 2
+    assert summary(svc, winner)["servicos_atribuidos"] == 1
+    assert summary(svc, "c1")["servicos_em_andamento"] == 1
+    assert all(summary(svc, user) == {} for user in users if user != winner)
+
+def test_transient_error_is_retried_by_with_transaction():
+    svc = manager()
+    svc.users.assignments.fail_insert.append(transient_error())
+    user = str(ObjectId())
+
+    result = run(svc.accept_service("s1", user))
+    assert result["status_code"] == 200
+    assert svc.client.retries == 1
+    assert len(svc.users.assignments.docs) == 1
+    assert svc.collection.docs[0]["versao"] == 2
+
+def test_reaccept_replaces_the_previous_assignment():
+    svc = manager()
+    first, second = str(ObjectId()), str(ObjectId())
+
+    async def scenario():
+        await svc.accept_service("s1", first)
+        svc.collection.docs[0]["servico"]["status"] = "PENDENTE"
+        return await svc.accept_service("s1", second)
+
+    assert run(scenario())["status_code"] == 200
+    assert [str(doc["user_id"]) for doc in svc.users.assignments.docs] == [second]
+    assert summary(svc, first)["servicos_atribuidos"] == 0
+    assert summary(svc, second)["servicos_atribuidos"] == 1
+
+def test_failed_accept_without_transaction_restores_service_and_assignment():
+    svc = manager(transactions=False)
+    first, second = str(ObjectId()), str(ObjectId())
+
+    async def scenario():
+        await svc.accept_service("s1", first)
+        svc.collection.docs[0]["servico"]["status"] = "PENDENTE"
+        svc.users.assignments.fail_insert.append(OperationFailure("disk full", code=14031))
+        return await svc.accept_service("s1", second)
+
+    result = run(scenario())
+    assert result["status_code"] == 500
+    service = svc.collection.docs[0]["servico"]
+    assert service["status"] == "PENDENTE"
+    assert service["responsavel_id"] == first
+    assert [str(doc["user_id"]) for doc in svc.users.assignments.docs] == [first]
+    assert summary(svc, first)["servicos_atribuidos"] == 1
+    assert summary(svc, second) == {}
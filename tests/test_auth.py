@@ -0,0 +1,26 @@
+"""
+Testes da validação de CPF em lote (auth.verify_cpf_batch).
+"""
+from auth import verify_cpf, verify_cpf_batch, CPF_REASONS
+
+CPFS = ["52998224725", "529.982.247-25", 52998224725, "52998224724", "52998224715", "11111111111", "123", "", None]
+
+def test_batch_matches_single_validation():
+    valid, reasons = verify_cpf_batch(CPFS)
+    assert valid.tolist() == [verify_cpf(str(cpf) if cpf is not None else "") for cpf in CPFS]
+    assert [CPF_REASONS[r] for r in reasons] == [
+        "ok", "ok", "ok", "dv2_invalido", "dv1_invalido", "digitos_repetidos",
+        "tamanho_invalido", "tamanho_invalido", "tamanho_invalido",
+    ]
+
+def test_oversized_cell_does_not_size_the_whole_batch():
+    # Com a largura ditada pela maior célula, isto pediria ~800 GB
+    cpfs = ["52998224725"] * 20000 + ["5" * 10_000_000]
+    valid, reasons = verify_cpf_batch(cpfs)
+    assert valid[:20000].all() and not valid[20000]
+    assert CPF_REASONS[reasons[20000]] == "tamanho_invalido"
+
+def test_only_oversized_cells():
+    valid, reasons = verify_cpf_batch(["x" * 100])
+    assert not valid.any()
+    assert CPF_REASONS[reasons[0]] == "tamanho_invalido"
@@ -0,0 +1,71 @@
+"""
+Testes do HTTPCacheMiddleware (http_cache.py) com apps ASGI mínimos.
+"""
+import asyncio
+from http_cache import HTTPCacheMiddleware, http_cache
+
+def run(coro):
+    return asyncio.run(coro)
+
+def streaming_app(content_type: bytes, endpoint=None):
+    """Envia os cabeçalhos e só manda o corpo depois de ``release``."""
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if endpoint is not None:
+            scope["endpoint"] = endpoint
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await release.wait()
+        await send({"type": "http.response.body", "body": b"data: 1\n\n", "more_body": False})
+    return app, release
+
+async def first_message(app, method: str = "GET"):
+    sent = []
+    scope = {"type": "http", "method": method, "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+
+    async def send(message):
+        sent.append(message)
+
+    task = asyncio.create_task(HTTPCacheMiddleware(app, minimum_size=0)(scope, None, send))
+    await asyncio.sleep(0.01)
+    return sent, task
+
+def test_event_stream_start_is_sent_before_first_body():
+    async def scenario():
+        app, release = streaming_app(b"text/event-stream; charset=utf-8")
+        sent, task = await first_message(app)
+        assert [m["type"] for m in sent] == ["http.response.start"]
+        release.set()
+        await task
+        return sent
+
+    sent = run(scenario())
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+    assert sent[1]["body"] == b"data: 1\n\n"
+
+def test_route_without_compress_and_etag_sends_start_immediately():
+    @http_cache(compress=False, etag=False)
+    async def endpoint():
+        pass
+
+    async def scenario():
+        app, release = streaming_app(b"application/json", endpoint)
+        sent, task = await first_message(app)
+        assert [m["type"] for m in sent] == ["http.response.start"]
+        release.set()
+        await task
+
+    run(scenario())
+
+def test_default_route_still_waits_for_body_to_add_etag():
+    async def scenario():
+        app, release = streaming_app(b"application/json")
+        sent, task = await first_message(app)
+        assert sent == []
+        release.set()
+        await task
+        return sent
+
+    sent = run(scenario())
+    headers = dict(sent[0]["headers"])
+    assert headers[b"etag"].startswith(b'W/"')
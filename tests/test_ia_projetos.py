@@ -0,0 +1,163 @@
+"""
+Testes do assistente de planejamento (app/routes/gestor_projetosIA.py)
+contra um chat model falso do LangChain: sem rede, sem GROQ_API_KEY e
+sem MongoDB.
+
+    python -m pytest tests
+"""
+import json
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from app.routes.gestor_projetosIA import ProjectPlanner, RateLimitExceeded, PlannerError
+
+PLAN = {
+    "resumo": "Loja virtual com catálogo e pagamento",
+    "etapas": [
+        {"titulo": "Levantamento", "descricao": "Requisitos e escopo", "duracao_dias": 5},
+        {"titulo": "Desenvolvimento", "descricao": "Catálogo e checkout", "duracao_dias": 20},
+    ],
+    "riscos": ["Integração com o gateway de pagamento"],
+    "tecnologias": ["FastAPI", "MongoDB"],
+    "prazo_total_dias": 25,
+}
+
+class FakeLLM(GenericFakeChatModel):
+    """Responde sempre com o mesmo texto, em partes, e conta as chamadas."""
+    calls: int = 0
+    delay: float = 0.01
+
+    async def _astream(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+def fake_llm(text: str = None, **fields) -> FakeLLM:
+    text = json.dumps(PLAN, ensure_ascii=False) if text is None else text
+    # Texto ilimitado: cada chamada recebe a mesma resposta
+    messages = iter(lambda: AIMessage(content=text), None)
+    return FakeLLM(messages=messages, **fields)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_plan_is_parsed_from_fenced_json():
+    planner = ProjectPlanner(llm=fake_llm("```json\n" + json.dumps(PLAN) + "\n```"))
+    assert run(planner.plan("u1", "Loja", "web", "Loja virtual")) == PLAN
+
+def test_identical_in_flight_requests_share_one_call():
+    llm = fake_llm()
+    planner = ProjectPlanner(llm=llm, burst=1)
+
+    async def scenario():
+        generations = [planner.request("u1", "Loja", "web", "Loja virtual") for _ in range(5)]
+        assert len({id(generation) for generation in generations}) == 1
+        return await asyncio.gather(*(generation.result() for generation in generations))
+
+    results = run(scenario())
+    assert llm.calls == 1
+    assert all(result == PLAN for result in results)
+    assert planner.in_flight == {}
+
+def test_cache_hits_exact_and_normalized_keys():
+    llm = fake_llm()
+    planner = ProjectPlanner(llm=llm)
+
+    async def scenario():
+        await planner.plan("u1", "App de Vendas", "Web", "Loja")
+        exact = planner.request("u2", "App de Vendas", "Web", "Loja")
+        normalized = planner.request("u2", "  app   de vendas!", "WEB", "Lója")
+        return exact, normalized
+
+    exact, normalized = run(scenario())
+    assert exact.done and normalized.done
+    assert normalized.plan == PLAN
+    assert llm.calls == 1
+
+def test_normalized_cache_can_be_disabled():
+    llm = fake_llm()
+    planner = ProjectPlanner(llm=llm, normalize=False)
+
+    async def scenario():
+        await planner.plan("u1", "App de Vendas", "Web", "Loja")
+        await planner.plan("u1", "app de vendas", "web", "loja")
+
+    run(scenario())
+    assert llm.calls == 2
+
+def test_token_bucket_limits_new_calls_per_user():
+    now = [1000.0]
+    planner = ProjectPlanner(llm=fake_llm(), burst=2, rate_per_minute=6)
+    planner.limiter.clock = lambda: now[0]
+
+    async def scenario():
+        await planner.plan("u1", "a", "web", "x")
+        await planner.plan("u1", "b", "web", "x")
+        # Acerto de cache não consome ficha
+        await planner.plan("u1", "a", "web", "x")
+        with pytest.raises(RateLimitExceeded) as error:
+            planner.request("u1", "c", "web", "x")
+        assert error.value.retry_after == pytest.approx(10)
+        # Outro usuário tem o próprio balde
+        await planner.plan("u2", "c", "web", "x")
+        # Uma ficha a cada 10s (6 por minuto)
+        now[0] += 10
+        await planner.plan("u1", "c", "web", "x")
+
+    run(scenario())
+
+def test_events_stream_chunks_then_plan():
+    planner = ProjectPlanner(llm=fake_llm())
+
+    async def scenario():
+        generation = planner.request("u1", "Loja", "web", "Loja virtual")
+        return [event async for event in generation.events()]
+
+    events = run(scenario())
+    chunks = [data for name, data in events if name == "chunk"]
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == PLAN
+    assert events[-1] == ("plan", PLAN)
+
+def test_invalid_output_fails_and_is_not_cached():
+    llm = fake_llm("não é um plano")
+    planner = ProjectPlanner(llm=llm)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(PlannerError):
+                await planner.plan("u1", "Loja", "web", "Loja virtual")
+
+    run(scenario())
+    assert llm.calls == 2
+    assert planner.in_flight == {}
+
+def test_timeout_becomes_planner_error():
+    planner = ProjectPlanner(llm=fake_llm(delay=1), timeout=0.05)
+    with pytest.raises(PlannerError, match="demorou"):
+        run(planner.plan("u1", "Loja", "web", "Loja virtual"))
+
+def test_sse_route(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from app.routes import plugins, views_new
+
+    monkeypatch.setattr(plugins, "planner", ProjectPlanner(llm=fake_llm()))
+    main.app.dependency_overrides[views_new.current_user] = lambda: {"id": "u1", "type": "Admin"}
+    try:
+        client = TestClient(main.app)
+        params = {"nome": "Loja", "tipo": "web", "descricao": "Loja virtual"}
+        response = client.post("/plugins/IaProjetos/stream", params=params)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: chunk" in response.text
+        last = response.text.strip().split("\n\n")[-1]
+        assert last.startswith("event: plan")
+        assert json.loads(last.split("data: ", 1)[1]) == PLAN
+
+        response = client.post("/plugins/IaProjetos", params=params)
+        assert response.json()["plano"] == PLAN
+    finally:
+        main.app.dependency_overrides.clear()
@@ -0,0 +1,100 @@
+"""
+Testes do BulkImporter (importer.py) contra coleções falsas em memória.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from pymongo.errors import BulkWriteError
+import importer
+from database import PasswordHasher
+from importer import BulkImporter, iter_rows
+
+def run(coro):
+    return asyncio.run(coro)
+
+CSV = "user.username,user.email,user.cpf,user.senha\n" + "".join(
+    f"u{i},u{i}@exemplo.com,{cpf},segredo{i}\n"
+    for i, cpf in enumerate(["52998224725", "11144477735", "12345678909", "00000000000"])
+)
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        if query["_id"] in self.docs:
+            self.docs[query["_id"]].update(update["$set"])
+
+    async def bulk_write(self, requests, ordered=True):
+        errors, inserted = [], 0
+        for index, request in enumerate(requests):
+            doc = request._doc
+            if doc["_id"] in self.docs:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = doc
+                inserted += 1
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": inserted})
+        return SimpleNamespace(inserted_count=inserted)
+
+    async def _find(self, ids):
+        for _id in ids:
+            if _id in self.docs:
+                yield {"_id": _id}
+
+    def find(self, query, projection=None):
+        return self._find(query["_id"]["$in"])
+
+class Clock(datetime):
+    """Cada chamada a now() anda uma hora: um reinício nunca cai no mesmo segundo."""
+    calls = 0
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.calls += 1
+        return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(hours=cls.calls)
+
+def fake_db() -> SimpleNamespace:
+    return SimpleNamespace(db={"users": FakeCollection(), "imports": FakeCollection()})
+
+def test_iter_rows_reads_in_blocks(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(CSV, encoding="utf-8")
+
+    async def scenario():
+        return [row async for row in iter_rows(str(path), "csv", block_size=3)]
+
+    rows = run(scenario())
+    assert [line for line, _, _ in rows] == [2, 3, 4, 5]
+    assert rows[0][1]["user"]["username"] == "u0"
+
+def test_restart_does_not_duplicate_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(PasswordHasher, "rounds", 4)
+    monkeypatch.setattr(importer, "datetime", Clock)
+    path = tmp_path / "users.csv"
+    path.write_text(CSV, encoding="utf-8")
+    db_conn = fake_db()
+    users = db_conn.db["users"]
+
+    async def scenario():
+        first = await BulkImporter(db_conn, "users", batch_size=2).run(str(path), "csv", "imp")
+        first = dict(first)
+        loader = BulkImporter(db_conn, "users", batch_size=2)
+        await loader.reset("imp")
+        second = await loader.run(str(path), "csv", "imp")
+        return first, second
+
+    first, second = run(scenario())
+    assert (first["inseridos"], first["rejeitados"]) == (3, 1)
+    assert len(users.docs) == 3
+    assert (second["inseridos"], second["ja_importados"], second["rejeitados"]) == (0, 3, 1)
+    rejects = (tmp_path / "users.csv.rejects.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(rejects) == 1
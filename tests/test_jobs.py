@@ -0,0 +1,60 @@
+"""
+Testes da fila de jobs em memória (jobs.py).
+"""
+import asyncio
+import jobs
+from jobs import MemoryJobQueue, DONE
+
+def run(coro):
+    return asyncio.run(coro)
+
+class FlakyQueue(MemoryJobQueue):
+    """Falha as primeiras ``failures`` buscas, como um backend em failover."""
+    def __init__(self, failures: int):
+        super().__init__(workers=1)
+        self.failures = failures
+
+    async def _next(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("backend indisponível")
+        return await super()._next()
+
+def test_worker_survives_errors_while_claiming(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_CLAIM_BACKOFF_MAX", 0.01)
+    queue = FlakyQueue(failures=3)
+
+    @queue.handler("echo")
+    async def echo(job):
+        return job["payload"]
+
+    async def scenario():
+        job = await queue.enqueue("echo", {"x": 1})
+        for _ in range(100):
+            if (await queue.get(job["_id"]))["status"] == DONE:
+                break
+            await asyncio.sleep(0.01)
+        stats = await queue.stats()
+        await queue.stop()
+        return await queue.get(job["_id"]), stats
+
+    job, stats = run(scenario())
+    assert job["status"] == DONE and job["result"] == {"x": 1}
+    assert stats["workers"] == 1
+
+def test_idempotency_key_is_scoped_by_owner():
+    queue = MemoryJobQueue(workers=0)
+
+    @queue.handler("echo")
+    async def echo(job):
+        return job["payload"]
+
+    async def scenario():
+        a = await queue.enqueue("echo", {}, idempotency_key="k", owner="u1")
+        again = await queue.enqueue("echo", {}, idempotency_key="k", owner="u1")
+        other = await queue.enqueue("echo", {}, idempotency_key="k", owner="u2")
+        return a, again, other
+
+    a, again, other = run(scenario())
+    assert again["_id"] == a["_id"]
+    assert other["_id"] != a["_id"]
@@ -0,0 +1,43 @@
+"""
+Testes do filtro de eventos por inscrito (live_updates.LiveUpdates).
+"""
+import asyncio
+from types import SimpleNamespace
+from live_updates import LiveUpdates
+
+def run(coro):
+    return asyncio.run(coro)
+
+def event(operation: str, _id: str, owner: str = None, collection: str = "services") -> dict:
+    document = None if owner is None else {"_id": _id, "cliente_info": {"id": owner}}
+    return {"collection": collection, "operation": operation, "id": _id, "document": document}
+
+def test_client_only_receives_deletes_for_ids_sent_to_it():
+    async def scenario():
+        live = LiveUpdates(SimpleNamespace(db=None))
+        live._task = asyncio.get_running_loop().create_future()  # sem laço real de leitura
+        client = live.subscribe({"id": "c1", "type": "cliente"})
+        other = live.subscribe({"id": "c2", "type": "cliente"})
+        admin = live.subscribe({"id": "a1", "type": "Admin"})
+
+        live.publish(event("insert", "s1", owner="c1"))
+        live.publish(event("update", "s2", owner="c2"))
+        live.publish(event("delete", "s1"))
+        live.publish(event("delete", "s2"))
+        live.publish(event("delete", "s3"))
+        # Repetir a exclusão não reenvia
+        live.publish(event("delete", "s1"))
+        live._task.cancel()
+
+        def received(queue):
+            items = []
+            while not queue.empty():
+                item = queue.get_nowait()
+                items.append((item["operation"], item["id"]))
+            return items
+        return received(client), received(other), received(admin)
+
+    client, other, admin = run(scenario())
+    assert client == [("insert", "s1"), ("delete", "s1")]
+    assert other == [("update", "s2"), ("delete", "s2")]
+    assert len(admin) == 6
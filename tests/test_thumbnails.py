@@ -0,0 +1,69 @@
+"""
+Testes do cache de miniaturas (thumbnails.py) num diretório temporário.
+"""
+import io
+import os
+import asyncio
+from PIL import Image
+from thumbnails import ThumbnailCache
+
+def run(coro):
+    return asyncio.run(coro)
+
+def png(size=(64, 48)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, "red").save(out, "PNG")
+    return out.getvalue()
+
+def test_variant_is_generated_once_and_served_from_disk(tmp_path):
+    cache = ThumbnailCache(directory=str(tmp_path))
+    loads = []
+
+    async def load_original():
+        loads.append(1)
+        return png()
+
+    async def scenario():
+        path = cache.path_for("f1", 32, 0, "png", 80)
+        results = await asyncio.gather(*(cache.get_or_create(path, load_original, 32, 0, "png", 80) for _ in range(5)))
+        await cache.get_or_create(path, load_original, 32, 0, "png", 80)
+        return path, results
+
+    path, results = run(scenario())
+    assert loads == [1]
+    assert set(results) == {path}
+    with Image.open(path) as image:
+        assert image.size == (32, 24)
+
+def test_open_variant_regenerates_a_file_evicted_before_opening(tmp_path, monkeypatch):
+    cache = ThumbnailCache(directory=str(tmp_path))
+    loads = []
+
+    async def load_original():
+        loads.append(1)
+        return png()
+
+    get_or_create = cache.get_or_create
+    evicted = []
+
+    async def racing_get_or_create(path, *args):
+        await get_or_create(path, *args)
+        if not evicted:
+            # Despejo entre o acerto de cache e a abertura do arquivo
+            evicted.append(path)
+            os.remove(path)
+        return path
+
+    monkeypatch.setattr(cache, "get_or_create", racing_get_or_create)
+
+    async def scenario():
+        path = cache.path_for("f1", 32, 0, "webp", 80)
+        variant = await cache.open_variant(path, load_original, 32, 0, "webp", 80)
+        # Um despejo depois de aberto não afeta a leitura
+        os.remove(path)
+        with variant:
+            return variant.read()
+
+    data = run(scenario())
+    assert loads == [1, 1]
+    assert data[:4] == b"RIFF"
@@ -0,0 +1,134 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+# Formatos aceitos: nome do parâmetro -> (formato do Pillow, content type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+MAX_DIMENSION = 2048
+# Originais maiores que isso não são lidos para gerar miniaturas
+MAX_SOURCE_SIZE = int(os.getenv("THUMBNAIL_MAX_SOURCE_MB", "20")) * 1024 * 1024
+
+def render_thumbnail(data: bytes, width: int, height: int, image_format: str, quality: int) -> bytes:
+    """
+    Redimensiona a imagem mantendo a proporção (cabe em width x height).
+    """
+    pil_format = FORMATS[image_format][0]
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width or MAX_DIMENSION, height or MAX_DIMENSION))
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = BytesIO()
+        image.save(out, pil_format, quality=quality, optimize=True)
+        return out.getvalue()
+
+class ThumbnailCache:
+    """
+    Cache em disco das variantes geradas, chaveado por (file_id, parâmetros).
+
+    A ordem de uso (LRU) vem do mtime dos arquivos, atualizado a cada
+    acerto; quando o total passa de ``max_bytes`` os menos usados são
+    removidos.
+    """
+    def __init__(self, directory: str = None, max_bytes: int = None, workers: int = None):
+        self.directory = directory or os.getenv(
+            "THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "connecta-thumbnails")
+        )
+        self.max_bytes = max_bytes or int(os.getenv("THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or int(os.getenv("THUMBNAIL_WORKERS", "2")),
+            thread_name_prefix="thumbnail"
+        )
+        self._pending = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def path_for(self, file_id: str, width: int, height: int, image_format: str, quality: int) -> str:
+        key = f"{file_id}:{width}x{height}:{image_format}:{quality}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.{image_format}")
+
+    async def get_or_create(self, path: str, load_original, width: int, height: int, image_format: str, quality: int) -> str:
+        """
+        Retorna o caminho da variante, gerando-a uma única vez mesmo com
+        requisições simultâneas. ``load_original`` é uma corrotina que
+        devolve os bytes da imagem original.
+        """
+        if await asyncio.to_thread(self._touch, path):
+            return path
+        if path not in self._pending:
+            self._pending[path] = asyncio.ensure_future(
+                self._create(path, load_original, width, height, image_format, quality)
+            )
+            self._pending[path].add_done_callback(lambda _: self._pending.pop(path, None))
+        await asyncio.shield(self._pending[path])
+        return path
+
+    async def open_variant(self, path: str, load_original, width: int, height: int, image_format: str, quality: int):
+        """
+        Como get_or_create, mas devolve a variante já aberta (binário). O
+        arquivo aberto continua legível mesmo se for despejado depois; se
+        sumir antes de ser aberto, é gerado de novo.
+        """
+        for _ in range(3):
+            await self.get_or_create(path, load_original, width, height, image_format, quality)
+            try:
+                return await asyncio.to_thread(open, path, "rb")
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(path)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        # Acerto de cache: renova o mtime (ordem LRU) numa única chamada
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, path: str, data: bytes) -> None:
+        # Grava num temporário e renomeia para nunca servir arquivo parcial
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    async def _create(self, path, load_original, width, height, image_format, quality) -> None:
+        data = await load_original()
+        loop = asyncio.get_running_loop()
+        thumbnail = await loop.run_in_executor(
+            self._executor, render_thumbnail, data, width, height, image_format, quality
+        )
+        await asyncio.to_thread(self._write, path, thumbnail)
+        self._size += len(thumbnail)
+        if self._size > self.max_bytes:
+            await loop.run_in_executor(self._executor, self._evict)
+
+    def _evict(self) -> None:
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        total = sum(entry.stat().st_size for entry in entries)
+        # Libera até 90% do orçamento para não despejar a cada nova variante
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total